@@ -1,19 +1,19 @@
 import random
 import time
 
-import numpy as np
+from app.AudioBuffer import AudioBuffer
 
 
 class ASRProcessorDemo:
     def __init__(self, asr, sampling_rate):
         self.sampling_rate = sampling_rate
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer = AudioBuffer(60 * sampling_rate)
         self.pause_time = 0
         self.out = ""
 
     def insert_audio_chunk(self, new_chunk):
         lc = len(self.audio_buffer) / self.sampling_rate
-        self.audio_buffer = np.append(self.audio_buffer, new_chunk)
+        self.audio_buffer.append(new_chunk)
         nl = len(self.audio_buffer) / self.sampling_rate
         self.out = f"buff {nl:.2f} new {nl - lc:.2f} pause {self.pause_time}"
         self.pause_time = random.randint(1, 5)
@@ -24,7 +24,7 @@ class ASRProcessorDemo:
 
     def finish(self):
         tl = len(self.audio_buffer) / self.sampling_rate
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer.clear()
         return f"finished total: {tl :.2f}\n"
 
     def process_iter(self):
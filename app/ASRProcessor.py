@@ -1,72 +1,180 @@
-import numpy as np
+import logging
+import time
+from collections import deque
 
+from app.AudioBuffer import AudioBuffer
 from app.OutputBuffer import HypothesisBuffer
-from app.models.types import Word
-import re
+from app.StopPhraseFilter import StopPhraseFilter, StopPhraseMatcher
+from app.models.types import Word, WordArray
+
+logger = logging.getLogger(__name__)
 
 
 class ASRProcessor:
-    audio_buffer = None
+    audio_buffer: AudioBuffer = None
     buffer_time_offset = 0
     transcript_buffer: HypothesisBuffer = None
-    commited = []
+    commited: WordArray = None
     buffer_trimming_sec = 30
+    # trims fall on the mel frame grid (whisper hop of 10 ms), so the features of the remaining audio stay reusable
+    trim_step = 160
+    metrics_writer = None  # MetricsWriter, when set every iteration is recorded
+    journal = None  # SessionJournal, when set the audio and the commited words are written to disk
+    # HallucinationDetector, when set suspect spans are dropped before they are commited and decoded again
+    hallucination_detector = None
 
-    def __init__(self, asr, sampling_rate):
+    def __init__(self, asr, sampling_rate, prompt_max_tokens=200, buffer_trimming_sec=30):
         self.asr = asr
-        # stop_segments = '|'.join(map(re.escape, asr.STOP_PHRASES))
-        self.asr_stop_phrases_regex = r'\s*(' + '|'.join(map(re.escape, asr.STOP_PHRASES)) + r')\s*\.*'
+        self.default_trimming_sec = buffer_trimming_sec
+        # whisper takes at most 223 prompt tokens (half of the text context)
+        self.prompt_max_tokens = prompt_max_tokens
+        # committed text goes through the filter on its way out, so a phrase split between iterations is removed too
+        self.stop_filter = StopPhraseFilter(StopPhraseMatcher(asr.STOP_PHRASES))
         self.sampling_rate = sampling_rate
+        # twice the trimming threshold: the buffer is trimmed only after it exceeds buffer_trimming_sec
+        self.audio_buffer = AudioBuffer(2 * buffer_trimming_sec * sampling_rate)
         self.reset()
 
     def reset(self):
-        self.audio_buffer = np.array([], dtype=np.float32)
+        self.audio_buffer.clear()
         self.buffer_time_offset = 0
-        self.transcript_buffer = HypothesisBuffer()
-        self.commited = []
-        self.buffer_trimming_sec = 30
+        # word times spread over segments (no word timestamps) can be off by a word or two
+        exact_times = getattr(self.asr, 'word_timestamps', True)
+        self.transcript_buffer = HypothesisBuffer(time_tolerance=0.1 if exact_times else 1.0)
+        self.commited = WordArray()
+        # may be lowered for the session by AdaptiveScheduler when iterations get too slow
+        self.buffer_trimming_sec = self.default_trimming_sec
+        self.stop_filter.reset()
+        self.trims = 0
+        # rolling prompt window: commited words that scrolled out of the audio buffer, bounded by prompt_max_tokens
+        self.prompt_window = deque()
+        self.prompt_tokens = 0
+        self.prompt_end = 0  # index in commited of the first word that is not in the window yet
+        # the uncommited region holds a rejected span: index of the next retry in hallucination_detector.retries
+        self.retry = 0
+        self.retry_options = None
 
     def insert_audio_chunk(self, audio):
-        self.audio_buffer = np.append(self.audio_buffer, audio)
+        self.audio_buffer.append(audio)
+        if self.journal is not None:
+            self.journal.audio(audio)
 
     def remove_stop_phrases(self, text):
-        return re.sub(self.asr_stop_phrases_regex, '', text, flags=re.IGNORECASE)
+        return self.stop_filter.remove(text)
 
     def to_flush(self, words: list[Word]):
         text = self.asr.sep.join(s.word for s in words if s.word)
         return text
 
+    def advance_prompt(self):
+        """Moves commited words that are not in the audio buffer anymore into the prompt window"""
+        ends = self.commited.ends
+        while self.prompt_end < len(ends) and ends[self.prompt_end] <= self.buffer_time_offset:
+            word = self.commited.words[self.prompt_end]
+            tokens = self.asr.count_tokens(word)
+            self.prompt_window.append((word, tokens))
+            self.prompt_tokens += tokens
+            self.prompt_end += 1
+        while self.prompt_window and self.prompt_tokens > self.prompt_max_tokens:
+            self.prompt_tokens -= self.prompt_window.popleft()[1]
+
     def prompt(self):
-        """Returns a tuple: (prompt, context), where "prompt" is a 200-character suffix of commited text that is inside of the scrolled away part of audio buffer.
-        "context" is the commited text that is inside the audio buffer. It is transcribed again and skipped. It is returned only for debugging and logging reasons.
+        """Returns a tuple: (prompt, context), where "prompt" is a suffix of commited text (up to prompt_max_tokens)
+        that is inside of the scrolled away part of audio buffer.
+        "context" is the commited text that is inside the audio buffer. It is transcribed again and skipped.
+        It is built only for debug logging, otherwise it is empty.
         """
-        k = next((i for i in range(len(self.commited) - 1, -1, -1)
-                  if self.commited[i].end <= self.buffer_time_offset), 0)
-        prompt = self.commited[:k]
-        non_prompt = self.commited[k:]
-        l = 0
-        i = len(prompt)
-        sep_len = len(self.asr.sep)
-        while i > 0 and l < 1000:
-            l += len(prompt[i - 1].word) + sep_len
-            i -= 1
-        return (self.to_flush(i) for i in (prompt, non_prompt))
+        prompt = self.asr.sep.join(word for word, _ in self.prompt_window)
+        context = ""
+        if logger.isEnabledFor(logging.DEBUG):
+            context = self.commited.text(self.prompt_end, None, self.asr.sep)
+        return prompt, context
 
     def process_iter(self):
         """Runs on the current audio buffer.
         Returns: a tuple (beg_timestamp, end_timestamp, "text"), or (None, None, "").
         The non-emty text is confirmed (committed) partial transcript.
         """
+        audio, prompt = self.prepare_iter()
+        t = time.perf_counter()
+        words, ends = self.asr.transcribe(audio, init_prompt=prompt, align_from=self.commit_point(),
+                                          options=self.decode_options())
+        transcribe_sec = time.perf_counter() - t
+        if self.metrics_writer is None:
+            return self.apply_iter(words, ends)
+
+        buffer_sec = len(audio) / self.sampling_rate
+        buffer_end = self.buffer_time_offset + buffer_sec
+        committed_before, trims_before = len(self.commited), self.trims
+        retried = self.retry_options is not None
+        detector = self.hallucination_detector
+        rejected_before = detector.rejected_words if detector is not None else 0
+        o = self.apply_iter(words, ends)
+        self.metrics_writer.write(
+            "iteration",
+            buffer_sec=round(buffer_sec, 3),
+            transcribe_sec=round(transcribe_sec, 4),
+            rtf=round(transcribe_sec / buffer_sec, 4) if buffer_sec else None,
+            words_committed=len(self.commited) - committed_before,
+            # how far the commited text lags behind the newest audio
+            commit_lag_sec=round(buffer_end - self.commited[-1].end, 3) if self.commited else None,
+            trimmed=self.trims > trims_before,
+            trimming_sec=self.buffer_trimming_sec,
+            retried=retried,
+            rejected_words=detector.rejected_words - rejected_before if detector is not None else None,
+        )
+        return o
+
+    def commit_point(self):
+        """Where the next commit starts, in seconds from the buffer start: word times matter most around it"""
+        return max(self.transcript_buffer.last_commited_time - self.buffer_time_offset, 0.0)
+
+    def decode_options(self):
+        """Decoding options of the next transcribe: None, or a retry of the uncommited region after a rejection"""
+        if self.retry_options is None:
+            return None
+        # only the audio after the commit point is decoded again, the words before it are settled
+        return {**self.retry_options, "clip_timestamps": [round(self.commit_point(), 3)]}
+
+    def screen(self, words: list[Word]):
+        """Drops the spans the hallucination detector suspects and queues the region for another decode"""
+        detector = self.hallucination_detector
+        point = self.commit_point()
+        spans = detector.spans(words, after=point)
+        if not spans:
+            self.retry, self.retry_options = 0, None
+            return words
+        logger.debug("rejected: %r", [self.to_flush(words[begin:end]) for begin, end in spans])
+        if self.retry > len(detector.retries):
+            # every set of options and one more plain decode gave the suspect words again:
+            # more likely quiet or unclear speech than a hallucination, they go on to be commited
+            self.retry_options = None
+            return detector.accept(words, spans)
+        # every retry uses other options, after them the region is decoded once more with the default ones
+        self.retry_options = detector.retries[self.retry] if self.retry < len(detector.retries) else None
+        self.retry += 1
+        return detector.reject(words, spans)
+
+    def prepare_iter(self):
+        """First half of process_iter: the audio and the prompt to transcribe, lets a server batch several sessions"""
         prompt, non_prompt = self.prompt()
-        iteration_words, iteration_ends = self.asr.transcribe(self.audio_buffer, init_prompt=prompt)
-        if not self.commited:
+        logger.debug("prompt: %r, context: %r", prompt, non_prompt)
+        return self.audio_buffer.view(), prompt
+
+    def apply_iter(self, iteration_words, iteration_ends):
+        """Second half of process_iter: takes the transcription of prepare_iter() audio, returns the commited text"""
+        if self.hallucination_detector is not None:
+            iteration_words = self.screen(iteration_words)
+        if not self.commited and iteration_words:
             iteration_words[0].word = iteration_words[0].word.lstrip()
         self.transcript_buffer.insert(iteration_words, self.buffer_time_offset)
         o = self.transcript_buffer.flush()
         self.commited.extend(o)
+        if self.journal is not None:
+            self.journal.words(o)
 
         if len(self.audio_buffer) / self.sampling_rate > self.buffer_trimming_sec:
-            if not self.commited: return
+            if not self.commited: return ""
             t = self.commited[-1].end
             if len(iteration_ends) > 1:
                 e = iteration_ends[-2] + self.buffer_time_offset
@@ -83,24 +191,34 @@ class ASRProcessor:
             #    k -= 1
             # t = self.commited[k].end
             # self.chunk_at(t)
-        return self.to_flush(o)
+        return self.stop_filter.feed(self.to_flush(o))
 
     def chunk_at(self, time):
         """trims the hypothesis and audio buffer at "time"
         """
         self.transcript_buffer.pop_commited(time)
-        cut_seconds = time - self.buffer_time_offset
-        self.audio_buffer = self.audio_buffer[int(cut_seconds * self.sampling_rate):]
-        self.buffer_time_offset = time
+        self.trims += 1
+        cut = int((time - self.buffer_time_offset) * self.sampling_rate) // self.trim_step * self.trim_step
+        self.audio_buffer.trim(cut)
+        self.buffer_time_offset += cut / self.sampling_rate
+        self.advance_prompt()
 
     def gel_all_text(self):
-        return self.to_flush(self.commited + self.transcript_buffer.complete())
+        parts = self.commited.text(sep=self.asr.sep), self.to_flush(self.transcript_buffer.complete())
+        return self.asr.sep.join(p for p in parts if p)
+
+    def speculative(self):
+        """The unconfirmed tail after the commited text: what the filter holds back and the latest hypothesis"""
+        tail = ''.join(self.stop_filter.pending) + self.to_flush(self.transcript_buffer.complete())
+        return self.stop_filter.remove(tail)
 
     def finish(self):
         """Flush the incomplete text when the whole processing ends.
         Returns: the same format as self.process_iter()
         """
         o = self.transcript_buffer.complete()
-        f = self.to_flush(o)
+        if self.journal is not None:
+            self.journal.words(o)
+        f = self.stop_filter.feed(self.to_flush(o)) + self.stop_filter.flush()
         self.reset()
         return f
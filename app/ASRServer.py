@@ -0,0 +1,150 @@
+"""
+Local streaming transcription server: one loaded model shared by any number of clients.
+
+Wire format, both directions: 1 byte frame type, 4 bytes big-endian payload length, payload.
+Client -> server:
+    A  int16 little-endian mono PCM at the model sampling rate
+    I  run an iteration, the reply is T with the newly commited text
+    G  the whole text of the session so far, reply T
+    F  finish the session (flush the incomplete tail and reset), reply T
+Server -> client:
+    T  utf-8 text
+"""
+import asyncio
+import queue
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from app.ASRProcessor import ASRProcessor
+from app.BatchTranscriber import transcribe_batch
+from app.HallucinationDetector import detector_from_settings
+
+HEADER = struct.Struct('>cI')
+AUDIO, ITERATE, GET_ALL, FINISH, TEXT = b'A', b'I', b'G', b'F', b'T'
+
+
+def pack_frame(kind: bytes, payload: bytes = b'') -> bytes:
+    return HEADER.pack(kind, len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class Session:
+    """Per-connection state: its own ASRProcessor and the audio received since the last iteration"""
+
+    def __init__(self, asr, settings, name):
+        self.name = name
+        self.processor = ASRProcessor(asr, settings.sample_rate,
+                                      prompt_max_tokens=settings.prompt_max_tokens,
+                                      buffer_trimming_sec=settings.buffer_trimming_sec)
+        self.processor.hallucination_detector = detector_from_settings(settings)
+        # audio is inserted by the inference thread only, so it never races with a running transcribe
+        self.pending_audio = deque()
+
+    def take_audio(self):
+        while self.pending_audio:
+            chunk = self.pending_audio.popleft()
+            self.processor.insert_audio_chunk(np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32768)
+
+
+class ASRServer:
+    """
+    Connections are served by asyncio, all processor work runs on one inference thread.
+    Every client waits for the reply to its request, so the FIFO of requests is round-robin across sessions;
+    iteration requests that are ready at the same time go to the model as one batch (up to max_batch).
+    """
+
+    def __init__(self, asr, settings, max_batch=4, batch_wait_sec=0.01):
+        self.asr = asr
+        self.settings = settings
+        self.max_batch = max_batch
+        self.batch_wait_sec = batch_wait_sec
+        self.jobs = queue.Queue()
+        self.sessions = 0
+        self.audio_sec = 0.0
+        self.busy_sec = 0.0
+        threading.Thread(target=self._inference_loop, daemon=True).start()
+
+    def _next_batch(self):
+        batch = [self.jobs.get()]
+        deadline = time.time() + self.batch_wait_sec
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.jobs.get(timeout=max(deadline - time.time(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _inference_loop(self):
+        while True:
+            batch = self._next_batch()
+            iterations = []
+            for session, kind, reply in batch:
+                session.take_audio()
+                if kind == ITERATE and len(session.processor.audio_buffer):
+                    iterations.append((session, reply))
+                elif kind == ITERATE:
+                    reply("")
+                elif kind == GET_ALL:
+                    p = session.processor
+                    reply(p.remove_stop_phrases(p.gel_all_text()))
+                elif kind == FINISH:
+                    reply(session.processor.finish())
+            self.run_iterations(iterations)
+
+    def run_iterations(self, iterations):
+        if not iterations:
+            return
+        t = time.time()
+        prepared = [session.processor.prepare_iter() for session, _ in iterations]
+        try:
+            results = transcribe_batch(self.asr, [a for a, _ in prepared], [p for _, p in prepared],
+                                       [session.processor.commit_point() for session, _ in iterations],
+                                       [session.processor.decode_options() for session, _ in iterations])
+        except Exception as e:
+            print(f"batch of {len(iterations)} failed: {e!r}")
+            results = [([], [])] * len(iterations)
+        self.busy_sec += time.time() - t
+        self.audio_sec += sum(len(a) for a, _ in prepared) / self.settings.sample_rate
+        for (session, reply), result in zip(iterations, results):
+            reply(session.processor.apply_iter(*result))
+
+    def throughput(self):
+        """Transcribed audio seconds per second of inference"""
+        return self.audio_sec / self.busy_sec if self.busy_sec else 0.0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        self.sessions += 1
+        session = Session(self.asr, self.settings, writer.get_extra_info('peername'))
+        print(f"{session.name} connected, {self.sessions} sessions")
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == AUDIO:
+                    session.pending_audio.append(payload)
+                    continue
+                result = loop.create_future()
+                self.jobs.put((session, kind, lambda text: loop.call_soon_threadsafe(result.set_result, text)))
+                writer.write(pack_frame(TEXT, (await result).encode('utf8')))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions -= 1
+            print(f"{session.name} disconnected, {self.sessions} sessions, "
+                  f"throughput {self.throughput():.1f} audio s/s")
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"ASR server on {host}:{port}")
+        async with server:
+            await server.serve_forever()
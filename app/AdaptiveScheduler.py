@@ -0,0 +1,33 @@
+class AdaptiveScheduler:
+    """
+    Picks how much new audio to wait for before the next process_iter from the measured decode time:
+    waiting for about as much audio as the previous decode took keeps the loop real-time on any hardware
+    (a fast GPU gets small chunks and low latency, a slow CPU gets bigger chunks instead of a growing backlog).
+    When an iteration exceeds the latency budget, the processor trims its audio buffer earlier,
+    because the decode cost grows with the buffer length; the threshold recovers while iterations are fast.
+    """
+
+    def __init__(self, min_chunk_sec=1.0, max_chunk_sec=5.0, latency_budget_sec=1.5,
+                 trimming_sec=30.0, min_trimming_sec=8.0, smoothing=0.5):
+        self.min_chunk_sec = min_chunk_sec
+        self.max_chunk_sec = max_chunk_sec
+        self.latency_budget_sec = latency_budget_sec
+        self.trimming_sec = trimming_sec
+        self.min_trimming_sec = min_trimming_sec
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.decode_sec = 0.0
+        self.over_budget = 0
+
+    def next_chunk_sec(self):
+        return min(max(self.decode_sec, self.min_chunk_sec), self.max_chunk_sec)
+
+    def on_iteration(self, decode_sec, processor):
+        self.decode_sec = self.smoothing * self.decode_sec + (1 - self.smoothing) * decode_sec
+        if decode_sec > self.latency_budget_sec:
+            self.over_budget += 1
+            processor.buffer_trimming_sec = max(self.min_trimming_sec, processor.buffer_trimming_sec * 0.75)
+        elif decode_sec < self.latency_budget_sec / 2:
+            processor.buffer_trimming_sec = min(self.trimming_sec, processor.buffer_trimming_sec + 1)
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class AudioBuffer:
+    """
+    Preallocated float32 audio store with amortized O(1) appends and O(1) trimming from the front.
+    Live samples are always kept contiguous, so view() can be handed to the model without copying.
+    """
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros(max(int(capacity), 1), dtype=np.float32)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def view(self) -> np.ndarray:
+        return self._data[self._start:self._end]
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+
+    def _reserve(self, n: int):
+        if self._end + n <= len(self._data):
+            return
+        size = len(self)
+        if size + n > len(self._data):
+            # live audio outgrew the capacity (nothing was committed yet) - grow geometrically
+            data = np.empty(max(len(self._data) * 2, size + n), dtype=np.float32)
+            data[:size] = self.view()
+            self._data = data
+        else:
+            # compact: move live samples to the front, happens once per capacity-worth of appends
+            self._data[:size] = self._data[self._start:self._end]
+        self._start = 0
+        self._end = size
+
+    def append(self, audio):
+        if isinstance(audio, (list, tuple)):
+            for chunk in audio:
+                self.append(chunk)
+            return
+        n = len(audio)
+        if not n:
+            return
+        self._reserve(n)
+        self._data[self._end:self._end + n] = audio
+        self._end += n
+
+    def trim(self, n: int):
+        """Drops the first n samples"""
+        self._start = min(self._start + max(int(n), 0), self._end)
+        if self._start == self._end:
+            self.clear()
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class Int16Ring:
+    """
+    Lock-free single-producer/single-consumer ring of int16 samples.
+    The producer (PortAudio callback) only advances _write, the consumer only advances _read,
+    both counters grow monotonically, so no lock is needed: each side publishes its counter after the copy.
+    """
+    scale = np.float32(1 / 32768)
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros(int(capacity), dtype=np.int16)
+        self._write = 0
+        self._read = 0
+        self.dropped_frames = 0
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def available(self):
+        return self._write - self._read
+
+    def write(self, in_data) -> int:
+        src = np.frombuffer(in_data, dtype=np.int16)
+        n = len(src)
+        free = self.capacity - self.available()
+        if n > free:
+            # the consumer is too slow: drop the newest frames, the ring never overwrites unread audio
+            self.dropped_frames += n - free
+            n = free
+        pos = self._write % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = src[:first]
+        self._data[:n - first] = src[first:n]
+        self._write += n
+        return n
+
+    def read_into(self, dest: np.ndarray) -> np.ndarray:
+        """Converts all available samples (up to len(dest)) to float32 in place and returns a view of dest"""
+        n = min(self.available(), len(dest))
+        pos = self._read % self.capacity
+        first = min(n, self.capacity - pos)
+        np.multiply(self._data[pos:pos + first], self.scale, out=dest[:first], dtype=np.float32)
+        np.multiply(self._data[:n - first], self.scale, out=dest[first:n], dtype=np.float32)
+        self._read += n
+        return dest[:n]
+
+    def clear(self):
+        self._read = self._write
@@ -1,23 +1,90 @@
 import pyaudio
 import numpy as np
-import queue
+import threading
+import time
+
+from app.AudioRing import Int16Ring
 from settings import Settings
 
 
 class AudioStreamManager:
+    """
+    With keep_stream_open the PortAudio stream runs all the time and recording only switches where the callback
+    puts the frames: between recordings they go to a small pre-roll ring that is overwritten,
+    on start the pre-roll goes first, so the first word is not clipped while a device starts.
+    """
     stream: pyaudio.Stream = None
+    metrics_writer = None
 
     def __init__(self, settings: Settings):
         self.p = pyaudio.PyAudio()
         self.settings = settings
-        self.queue_audio_buffer = queue.Queue()
+        capacity = int(settings.capture_ring_sec * settings.sample_rate)
+        self.ring = Int16Ring(capacity)
+        # reusable destination for read_audio_data, the returned block is valid until the next read
+        self._read_buffer = np.empty(capacity, dtype=np.float32)
+        self.input_overflows = 0
+        # set by the callback once enough new audio is queued, or by notify() when recording stops
+        self.audio_ready = threading.Event()
+        self.wake_samples = int(settings.min_chunk_sec * settings.sample_rate)
+        self.last_chunk_time = 0.0
+        # last preroll_sec of audio before the start, written only by the callback
+        self._preroll = np.zeros(max(int(settings.preroll_sec * settings.sample_rate), 1), dtype=np.int16)
+        self._preroll_written = 0
+        self.recording = False
+        self._pressed_at = None  # set by start_recording, the callback takes it and starts recording
+        self.start_latency = None  # from the hotkey press to the first frame of the recording
         self.open_stream()
-        self.stop_stream()
+        if not settings.keep_stream_open:
+            self.stop_stream()
 
     def audio_callback(self, in_data, frame_count, time_info, status):
-        audio_data = np.frombuffer(in_data, dtype=np.int16).astype(np.float32) / 32768
-        self.queue_audio_buffer.put(audio_data)
-        return in_data, pyaudio.paContinue
+        # keep the callback thread short: one copy into the ring, no allocations and no conversions
+        now = time.time()
+        pressed_at, self._pressed_at = self._pressed_at, None
+        if pressed_at is not None:
+            self.start_latency = now - pressed_at
+            self.ring.write(self._take_preroll())
+            self.recording = True
+        if not self.recording:
+            self._keep_preroll(in_data)
+            return None, pyaudio.paContinue
+        self.ring.write(in_data)
+        self.last_chunk_time = now
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        if self.ring.available() >= self.wake_samples:
+            self.audio_ready.set()
+        return None, pyaudio.paContinue
+
+    def _keep_preroll(self, in_data):
+        src = np.frombuffer(in_data, dtype=np.int16)[-len(self._preroll):]
+        pos = self._preroll_written % len(self._preroll)
+        first = min(len(src), len(self._preroll) - pos)
+        self._preroll[pos:pos + first] = src[:first]
+        self._preroll[:len(src) - first] = src[first:]
+        self._preroll_written += len(src)
+
+    def _take_preroll(self):
+        n = min(self._preroll_written, len(self._preroll))
+        pos = self._preroll_written % len(self._preroll)
+        self._preroll_written = 0
+        return np.concatenate((self._preroll[pos:], self._preroll[:pos]))[len(self._preroll) - n:]
+
+    def start_recording(self, pressed_at=None):
+        """Called by the control loop; the callback switches to recording on its next block"""
+        if not self.settings.keep_stream_open:
+            self._preroll_written = 0  # the pre-roll is from before the last stop
+        self._pressed_at = pressed_at or time.time()
+        if not self.settings.keep_stream_open:
+            self.start_stream()
+
+    def stop_recording(self):
+        self.recording = False
+        self._pressed_at = None
+        if not self.settings.keep_stream_open:
+            self.stop_stream()
+        self.notify()
 
     def close(self):
         if self.stream is not None:
@@ -34,7 +101,7 @@ class AudioStreamManager:
             rate=self.settings.sample_rate,
             input=True,
             input_device_index=self.settings.active_microphone_device,
-            frames_per_buffer=4096,
+            frames_per_buffer=self.settings.frames_per_buffer,
             stream_callback=self.audio_callback
         )
 
@@ -47,14 +114,38 @@ class AudioStreamManager:
     def stop_stream(self):
         self.stream.stop_stream()
 
-    def get_audio_data(self):
-        data_list = []
-        while not self.queue_audio_buffer.empty():
-            data_list.append(self.queue_audio_buffer.get())
-        return data_list
+    def set_wake_sec(self, seconds):
+        self.wake_samples = int(seconds * self.settings.sample_rate)
+
+    def notify(self):
+        self.audio_ready.set()
+
+    def wait_audio(self, timeout=None):
+        return self.audio_ready.wait(timeout)
+
+    def get_audio_data(self) -> np.ndarray:
+        """Returns all captured audio as one contiguous float32 block (a view of a reusable buffer)"""
+        self.audio_ready.clear()
+        audio = self.ring.read_into(self._read_buffer)
+        if self.metrics_writer is not None:
+            self.metrics_writer.write("capture", read_sec=round(len(audio) / self.settings.sample_rate, 3),
+                                      **self.metrics())
+        return audio
+
+    @property
+    def dropped_frames(self):
+        return self.ring.dropped_frames
+
+    def metrics(self):
+        return {
+            "depth_sec": round(self.ring.available() / self.settings.sample_rate, 3),
+            "dropped_frames": self.ring.dropped_frames,
+            "input_overflows": self.input_overflows,
+            "start_latency_sec": round(self.start_latency, 3) if self.start_latency is not None else None,
+        }
 
     def empty(self):
-        return self.queue_audio_buffer.empty()
+        return self.ring.available() == 0
 
     def __del__(self):
         self.close()
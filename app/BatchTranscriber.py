@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchTranscriber:
+    """
+    Thread-safe front of an ASR with the same transcribe() interface, for several ASRProcessors
+    (concurrent streams, offline chunks) sharing one model: calls arriving within max_wait_sec
+    are collected into one asr.transcribe_batch() call of up to max_batch buffers.
+    Keeps throughput statistics in audio seconds per wall second.
+    """
+
+    def __init__(self, asr, max_batch=4, max_wait_sec=0.02, sampling_rate=16000):
+        self.asr = asr
+        self.max_batch = max_batch
+        self.max_wait_sec = max_wait_sec
+        self.sampling_rate = sampling_rate
+        self.sep = asr.sep
+        self.STOP_PHRASES = asr.STOP_PHRASES
+        self._pending = []
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        self.audio_sec = 0.0
+        self.busy_sec = 0.0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def count_tokens(self, text):
+        return self.asr.count_tokens(text)
+
+    def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+        future = Future()
+        with self._cond:
+            self._pending.append((audio, (init_prompt, align_from, options), future))
+            self._cond.notify()
+        return future.result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.time() + self.max_wait_sec
+            while len(self._pending) < self.max_batch and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            t = time.time()
+            try:
+                results = transcribe_batch(self.asr, [a for a, _, _ in batch], [p for _, (p, _, _), _ in batch],
+                                           [c for _, (_, c, _), _ in batch], [o for _, (_, _, o), _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.busy_sec += time.time() - t
+            self.batches += 1
+            self.items += len(batch)
+            self.audio_sec += sum(len(a) for a, _, _ in batch) / self.sampling_rate
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "audio_sec": round(self.audio_sec, 2),
+            "throughput": round(self.audio_sec / self.busy_sec, 2) if self.busy_sec else 0.0,
+        }
+
+
+def transcribe_batch(asr, audios, prompts, align_from=None, options=None):
+    """asr.transcribe_batch when the backend has it, one by one otherwise"""
+    align_from = align_from or [None] * len(audios)
+    options = options or [None] * len(audios)
+    if len(audios) > 1 and hasattr(asr, 'transcribe_batch'):
+        return asr.transcribe_batch(audios, prompts, align_from, options)
+    return [asr.transcribe(audio, init_prompt=prompt, align_from=point, options=option)
+            for audio, prompt, point, option in zip(audios, prompts, align_from, options)]
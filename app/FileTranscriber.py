@@ -0,0 +1,129 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from app.VoiceGate import VoiceGate
+from app.models.types import Word
+
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.ogg', '.oga', '.opus', '.flac', '.m4a', '.webm', '.mp4', '.mkv'}
+
+
+def load_audio(path, sampling_rate=16000):
+    import librosa
+    audio, _ = librosa.load(path, sr=sampling_rate, dtype=np.float32)
+    return audio
+
+
+def collect_files(paths):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def split_on_silence(audio, sampling_rate, max_chunk_sec=30.0, search_sec=10.0, frame_sec=0.03):
+    """
+    Splits audio into chunks not longer than max_chunk_sec.
+    Every cut is made at the quietest frame of the last search_sec of the chunk, so words are not cut in half.
+    Returns a list of (begin, end) sample indices.
+    """
+    frame = int(frame_sec * sampling_rate)
+    max_chunk = int(max_chunk_sec * sampling_rate)
+    n_frames = len(audio) // frame
+    levels = VoiceGate.frame_levels(audio[:n_frames * frame].reshape(n_frames, frame)) if n_frames else []
+
+    chunks = []
+    begin = 0
+    while len(audio) - begin > max_chunk:
+        lo = max((begin + max_chunk - int(search_sec * sampling_rate)) // frame, begin // frame + 1)
+        hi = (begin + max_chunk) // frame
+        cut = (lo + int(np.argmin(levels[lo:hi]))) * frame + frame // 2
+        chunks.append((begin, cut))
+        begin = cut
+    if begin < len(audio):
+        chunks.append((begin, len(audio)))
+    return chunks
+
+
+class FileTranscriber:
+    """
+    Decodes audio files as fast as possible: each file is split at silence into chunks,
+    chunks are transcribed concurrently (CTranslate2 runs num_workers requests of one model in parallel),
+    words are shifted by the chunk position and stitched in order.
+    """
+
+    def __init__(self, asr, workers=1, sampling_rate=16000, max_chunk_sec=30.0):
+        self.asr = asr
+        self.workers = workers
+        self.sampling_rate = sampling_rate
+        self.max_chunk_sec = max_chunk_sec
+
+    def _transcribe_chunk(self, audio, begin):
+        words, _ = self.asr.transcribe(audio)
+        offset = begin / self.sampling_rate
+        return [word.add_offset(offset) for word in words]
+
+    def transcribe(self, audio) -> list[Word]:
+        chunks = split_on_silence(audio, self.sampling_rate, self.max_chunk_sec)
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = pool.map(lambda c: self._transcribe_chunk(audio[c[0]:c[1]], c[0]), chunks)
+            words = [word for chunk_words in results for word in chunk_words]
+        if words:
+            words[0].word = words[0].word.lstrip()
+        return words
+
+    def transcribe_file(self, path) -> list[Word]:
+        return self.transcribe(load_audio(path, self.sampling_rate))
+
+
+def group_cues(words: list[Word], max_sec=7.0, max_chars=80, max_pause=0.8):
+    cues, cue = [], []
+    for word in words:
+        if cue and (word.end - cue[0].start > max_sec
+                    or sum(len(w.word) for w in cue) + len(word.word) > max_chars
+                    or word.start - cue[-1].end > max_pause):
+            cues.append(cue)
+            cue = []
+        cue.append(word)
+        if word.word.rstrip().endswith(('.', '!', '?')):
+            cues.append(cue)
+            cue = []
+    if cue:
+        cues.append(cue)
+    return cues
+
+
+def srt_time(seconds):
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def to_txt(words: list[Word], sep=""):
+    return sep.join(w.word for w in words).strip() + "\n"
+
+
+def to_srt(words: list[Word], sep=""):
+    lines = []
+    for i, cue in enumerate(group_cues(words), 1):
+        text = sep.join(w.word for w in cue).strip()
+        lines.append(f"{i}\n{srt_time(cue[0].start)} --> {srt_time(cue[-1].end)}\n{text}\n")
+    return "\n".join(lines)
+
+
+def to_json(words: list[Word], sep=""):
+    return json.dumps({
+        "text": to_txt(words, sep).strip(),
+        "words": [{"start": round(w.start, 3), "end": round(w.end, 3), "word": w.word,
+                   "probability": round(w.probability, 4)} for w in words],
+    }, ensure_ascii=False, indent=1)
+
+
+WRITERS = {'txt': to_txt, 'srt': to_srt, 'json': to_json}
@@ -0,0 +1,159 @@
+import re
+import zlib
+
+from app.models.types import Word
+
+# punctuation and case do not make a repetition different: "Спасибо." and "спасибо" are the same word
+NORMALIZE_RE = re.compile(r'[^\w]+')
+
+
+def normalize(word: str) -> str:
+    return NORMALIZE_RE.sub('', word).lower()
+
+
+def compression_ratio(text: str) -> float:
+    """The same measure whisper uses for its temperature fallback: looping text compresses well"""
+    data = text.encode('utf8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+def merge_spans(spans):
+    merged = []
+    for begin, end in sorted(spans):
+        if merged and begin <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((begin, end))
+    return merged
+
+
+class HallucinationDetector:
+    """
+    Finds the spans of a hypothesis that look like whisper hallucinations, before they can be commited:
+    - a run of words the model itself is unsure of (word probability below min_probability),
+    - an n-gram repeated back to back (the decoder stuck in a loop), the first occurrence is kept,
+    - a tail that compresses too well (the same measure whisper uses to retry a segment).
+    The spans are word index ranges [begin, end), ASRProcessor drops them and decodes the region again
+    with the next set of decoding options from `retries` (another temperature or beam size).
+    A span that survives all of them is accepted: losing real speech is worse than a stray phrase.
+    """
+
+    def __init__(self, min_probability=0.25, low_probability_words=3, max_ngram=4, min_repeats=3,
+                 min_repeated_words=6, max_compression_ratio=2.4, min_compression_chars=80, retries=()):
+        self.min_probability = min_probability
+        # a single unsure word is common on names and numbers, a run of them is not
+        self.low_probability_words = low_probability_words
+        self.max_ngram = max_ngram
+        # copies of an n-gram after the first one, and at least that many words in them: "да да да" is speech
+        self.min_repeats = min_repeats
+        self.min_repeated_words = min_repeated_words
+        self.max_compression_ratio = max_compression_ratio
+        # zlib has a fixed overhead, the ratio of a short text says nothing
+        self.min_compression_chars = min_compression_chars
+        # decoding options for FasterWhisperASR.transcribe(options=...), tried in order for a rejected region
+        self.retries = list(retries)
+        self.counts = {"low_probability": 0, "repetition": 0, "compression": 0}
+        self.rejected_spans = 0
+        self.rejected_words = 0
+        self.accepted_spans = 0
+
+    def low_probability(self, words: list[Word]):
+        spans, begin = [], None
+        for i, word in enumerate(words + [None]):
+            if word is not None and word.probability < self.min_probability:
+                begin = i if begin is None else begin
+                continue
+            if begin is not None and i - begin >= self.low_probability_words:
+                spans.append((begin, i))
+            begin = None
+        return spans
+
+    def repetitions(self, words: list[Word]):
+        tokens = [normalize(w.word) for w in words]
+        spans, i = [], 0
+        while i < len(tokens):
+            found = None
+            for n in range(1, self.max_ngram + 1):
+                gram = tokens[i:i + n]
+                if len(gram) < n or not all(gram):
+                    break
+                repeats, j = 0, i + n
+                while tokens[j:j + n] == gram:
+                    repeats += 1
+                    j += n
+                if repeats >= self.min_repeats and repeats * n >= self.min_repeated_words:
+                    found = (i + n, j)
+                    break
+            if found:
+                spans.append(found)
+                i = found[1]
+            else:
+                i += 1
+        return spans
+
+    def compression(self, words: list[Word], first=0):
+        """Only the words from `first` on: speech may repeat itself over a long buffer, a loop is all in the tail"""
+        text = "".join(w.word for w in words[first:])
+        if len(text) < self.min_compression_chars or compression_ratio(text) <= self.max_compression_ratio:
+            return []
+        # the loop is inside the shortest tail that still compresses too well,
+        # it spans the words that were already said earlier in that tail
+        for i in range(len(words) - 1, first - 1, -1):
+            tail = "".join(w.word for w in words[i:])
+            if len(tail) >= self.min_compression_chars and compression_ratio(tail) > self.max_compression_ratio:
+                seen, repeated = set(), []
+                for k in range(i, len(words)):
+                    token = normalize(words[k].word)
+                    if token in seen:
+                        repeated.append(k)
+                    seen.add(token)
+                return [(repeated[0], repeated[-1] + 1)] if repeated else []
+        return []
+
+    def spans(self, words: list[Word], after=float('-inf')):
+        """Suspect word ranges [begin, end) of a hypothesis that end after `after` (seconds), sorted and merged.
+        The words before it give the context: the commited original of a repeated phrase"""
+        first = next((i for i, w in enumerate(words) if w.end > after), len(words))
+        found = []
+        for name, check in (("low_probability", self.low_probability), ("repetition", self.repetitions),
+                            ("compression", lambda w: self.compression(w, first))):
+            spans = [(begin, end) for begin, end in check(words) if words[end - 1].end > after]
+            self.counts[name] += len(spans)
+            found.extend(spans)
+        return merge_spans(found)
+
+    def reject(self, words: list[Word], spans):
+        """The words without the spans"""
+        self.rejected_spans += len(spans)
+        self.rejected_words += sum(end - begin for begin, end in spans)
+        kept, position = [], 0
+        for begin, end in spans:
+            kept.extend(words[position:begin])
+            position = end
+        kept.extend(words[position:])
+        return kept
+
+    def accept(self, words: list[Word], spans):
+        """The words as they are, the spans are counted as suspects that were let through"""
+        self.accepted_spans += len(spans)
+        return words
+
+    def stats(self):
+        return {"rejected_spans": self.rejected_spans, "rejected_words": self.rejected_words,
+                "accepted_spans": self.accepted_spans, **self.counts}
+
+
+def detector_from_settings(settings):
+    """The detector of the live app: built from the hallucination_* settings, None when hallucination_detector is off"""
+    return build_detector(settings) if settings.hallucination_detector else None
+
+
+def build_detector(settings):
+    """A detector with the hallucination_* thresholds and retries, whether or not the live app has it on"""
+    return HallucinationDetector(min_probability=settings.hallucination_min_probability,
+                                 low_probability_words=settings.hallucination_low_probability_words,
+                                 max_ngram=settings.hallucination_max_ngram,
+                                 min_repeats=settings.hallucination_min_repeats,
+                                 min_repeated_words=settings.hallucination_min_repeated_words,
+                                 max_compression_ratio=settings.hallucination_max_compression_ratio,
+                                 retries=settings.hallucination_retries)
@@ -0,0 +1,33 @@
+import time
+
+
+class LatencyMeter:
+    """
+    Estimates the delay between the moment a word was spoken and the moment it was typed.
+    Word timestamps are in processor time (seconds of audio since reset),
+    so they are mapped to wall time through the capture time of the newest captured sample.
+    Audio is counted before the VoiceGate: the silence it dropped in front of a word is added back,
+    otherwise after every pause the words would look spoken later than they were.
+    """
+
+    def __init__(self, sampling_rate, gate=None):
+        self.sampling_rate = sampling_rate
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self.audio_sec = 0.0
+        self.capture_time = 0.0
+
+    def on_audio(self, n_samples, capture_time):
+        """n_samples: captured samples, before the gate"""
+        self.audio_sec += n_samples / self.sampling_rate
+        self.capture_time = capture_time
+
+    def spoken_at(self, word_end):
+        if self.gate is not None:
+            word_end += self.gate.dropped_before(word_end)
+        return self.capture_time - (self.audio_sec - word_end)
+
+    def measure(self, word_end):
+        return time.time() - self.spoken_at(word_end)
@@ -0,0 +1,51 @@
+import cProfile
+import json
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+
+
+class MetricsWriter:
+    """
+    Structured metrics as JSON lines: one object per event with a timestamp and the event name.
+    The file rotates by size (path, path.1, ... path.N), writes are thread-safe.
+    """
+
+    def __init__(self, path, max_bytes=5 * 2 ** 20, backups=3):
+        self.logger = logging.getLogger(f"metrics.{path}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def write(self, event, **fields):
+        self.logger.info(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False))
+
+
+class IterationProfiler:
+    """
+    cProfile around every process_iter call, stats accumulate over the session and are dumped
+    to a .prof file (snakeviz, pstats) by dump(). For sampling profilers (py-spy) the transcription
+    thread is named, so it can be told apart from the capture and output threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.calls = 0
+
+    def wrap(self, fn):
+        def profiled(*args, **kwargs):
+            self.calls += 1
+            self.profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.profile.disable()
+        return profiled
+
+    def dump(self):
+        if self.calls:
+            self.profile.dump_stats(self.path)
@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+
+class ModelCache:
+    """
+    Loaded models keyed by their configuration, the least recently used one is dropped when more than
+    capacity are loaded. The same configuration always gets the same instance, so the live dictation and
+    the background jobs share a model when they ask for the same one.
+    """
+
+    def __init__(self, factory, capacity=2):
+        self.factory = factory
+        self.capacity = capacity
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(config: dict):
+        return tuple(sorted(config.items()))
+
+    def get(self, **config):
+        key = self.key(config)
+        # loading takes seconds to minutes, other configurations wait, which is fine for a couple of models
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            model = self.factory(**config)
+            self.loads += 1
+            self._models[key] = model
+            while len(self._models) > self.capacity:
+                # CTranslate2 frees the weights when the last reference is gone
+                self._models.popitem(last=False)
+                self.evictions += 1
+            return model
+
+    def __contains__(self, config: dict):
+        return self.key(config) in self._models
+
+    def __len__(self):
+        return len(self._models)
@@ -0,0 +1,210 @@
+import threading
+import time
+import wave
+
+import numpy as np
+
+from app.AudioBuffer import AudioBuffer
+from app.AudioRing import Int16Ring
+from app.Resampler import PolyphaseResampler
+
+
+class CaptureSource:
+    """
+    One input at its native rate and channel count. The producer (device callback or file feeder) pushes
+    interleaved int16 into a lock-free ring, read() on the consumer side downmixes everything queued
+    to mono and resamples it to the target rate with a streaming polyphase filter.
+    """
+    on_audio = None  # called by the producer after every push, wakes the consumer
+
+    def __init__(self, label, rate, channels=1, target_rate=16000, ring_sec=60):
+        self.label = label
+        self.rate = int(rate)
+        self.channels = channels
+        self.ring = Int16Ring(int(ring_sec * self.rate) * channels)
+        self._read_buffer = np.empty(self.ring.capacity, dtype=np.float32)
+        self.resampler = PolyphaseResampler(self.rate, target_rate)
+        self.input_overflows = 0
+
+    def push(self, in_data):
+        # whole frames only: writes and reads are multiples of channels, so the ring stays frame-aligned
+        self.ring.write(in_data)
+        if self.on_audio is not None:
+            self.on_audio(self)
+
+    def available_sec(self):
+        return self.ring.available() / self.channels / self.rate
+
+    def read(self) -> np.ndarray:
+        n = self.ring.available()
+        audio = self.ring.read_into(self._read_buffer[:n - n % self.channels])
+        if self.channels > 1:
+            audio = audio.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        return self.resampler.process(audio)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+    def metrics(self):
+        return {
+            "rate": self.rate,
+            "channels": self.channels,
+            "depth_sec": round(self.available_sec(), 3),
+            "dropped_frames": self.ring.dropped_frames // self.channels,
+            "input_overflows": self.input_overflows,
+        }
+
+
+class DeviceSource(CaptureSource):
+    """
+    PortAudio input opened at the device's own default rate and up to two channels, so 44.1/48 kHz
+    microphones and loopback devices (PulseAudio/PipeWire monitors, ALSA snd-aloop, "Stereo Mix") work as is.
+    """
+
+    def __init__(self, p, device_index, label=None, target_rate=16000, frames_per_buffer=4096, ring_sec=60):
+        import pyaudio
+        self._pyaudio = pyaudio
+        info = p.get_device_info_by_index(device_index)
+        super().__init__(label or info['name'], info['defaultSampleRate'], min(int(info['maxInputChannels']), 2),
+                         target_rate, ring_sec)
+        self.stream = p.open(format=pyaudio.paInt16, channels=self.channels, rate=self.rate, input=True,
+                             input_device_index=device_index, frames_per_buffer=frames_per_buffer,
+                             stream_callback=self._callback, start=False)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.push(in_data)
+        if status & self._pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        return None, self._pyaudio.paContinue
+
+    def start(self):
+        self.stream.start_stream()
+
+    def stop(self):
+        self.stream.stop_stream()
+
+    def close(self):
+        self.stream.close()
+
+
+class FileSource(CaptureSource):
+    """
+    Plays a WAV file as if it were a device: blocks of frames_per_buffer are pushed from a thread,
+    in real time (speed=1), faster (speed=N), or as fast as the consumer reads (speed=0).
+    For testing the whole capture path without sound hardware.
+    """
+
+    def __init__(self, path, label=None, target_rate=16000, frames_per_buffer=4096, ring_sec=60, speed=1.0):
+        self.wav = wave.open(str(path), 'rb')
+        if self.wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        super().__init__(label or str(path), self.wav.getframerate(), self.wav.getnchannels(), target_rate, ring_sec)
+        self.frames_per_buffer = frames_per_buffer
+        self.speed = speed
+        self.finished = threading.Event()
+        self._running = threading.Event()
+        threading.Thread(target=self._feed, name=f'file {self.label}', daemon=True).start()
+
+    def _feed(self):
+        block_sec = self.frames_per_buffer / self.rate
+        while True:
+            self._running.wait()
+            data = self.wav.readframes(self.frames_per_buffer)
+            if not data:
+                break
+            if self.speed:
+                time.sleep(block_sec / self.speed)
+            else:
+                while self.ring.capacity - self.ring.available() < len(data) // 2:
+                    time.sleep(0.005)
+            self.push(data)
+        self.finished.set()
+        if self.on_audio is not None:
+            self.on_audio(self)
+
+    def start(self):
+        self._running.set()
+
+    def stop(self):
+        self._running.clear()
+
+    def close(self):
+        self.wav.close()
+
+
+class MultiStreamCapture:
+    """
+    Several sources captured at once, resampled to one rate. read() returns {label: audio}:
+    - separate: every source is its own channel, to be transcribed by its own ASRProcessor
+    - mix: one 'mix' channel, the sum of the sources aligned sample by sample. A source that stalls
+      (unplugged device, finished file) holds the mix back by at most max_skew_sec, then counts as silence.
+    """
+    MIX = 'mix'
+
+    def __init__(self, sources: list[CaptureSource], mix=False, sampling_rate=16000, wake_sec=1.0,
+                 max_skew_sec=1.0):
+        self.sources = sources
+        self.mix = mix
+        self.sampling_rate = sampling_rate
+        self.wake_sec = wake_sec
+        self.max_skew = int(max_skew_sec * sampling_rate)
+        self.audio_ready = threading.Event()
+        for source in sources:
+            source.on_audio = self._on_audio
+        self._pending = [AudioBuffer(int(4 * max_skew_sec * sampling_rate)) for _ in sources] if mix else None
+
+    @property
+    def labels(self):
+        return [self.MIX] if self.mix else [s.label for s in self.sources]
+
+    def _on_audio(self, source):
+        if source.available_sec() >= self.wake_sec or getattr(source, 'finished', None) and source.finished.is_set():
+            self.audio_ready.set()
+
+    def wait_audio(self, timeout=None):
+        return self.audio_ready.wait(timeout)
+
+    def read(self) -> dict[str, np.ndarray]:
+        self.audio_ready.clear()
+        if not self.mix:
+            return {s.label: s.read() for s in self.sources}
+        for source, pending in zip(self.sources, self._pending):
+            pending.append(source.read())
+        lengths = [len(p) for p in self._pending]
+        n = max(lengths) if self._sources_done() else max(min(lengths), max(lengths) - self.max_skew)
+        mixed = np.zeros(n, dtype=np.float32)
+        for pending in self._pending:
+            audio = pending.view()[:n]
+            mixed[:len(audio)] += audio
+            pending.trim(len(audio))
+        return {self.MIX: np.clip(mixed, -1, 1, out=mixed)}
+
+    def start(self):
+        for source in self.sources:
+            source.start()
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+        self.audio_ready.set()
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+
+    def _sources_done(self):
+        return all(getattr(s, 'finished', None) and s.finished.is_set() and not s.ring.available()
+                   for s in self.sources)
+
+    def finished(self):
+        """All sources are files that were played to the end, and everything is read"""
+        return self._sources_done() and not any(len(p) for p in self._pending or ())
+
+    def metrics(self):
+        return {s.label: s.metrics() for s in self.sources}
@@ -1,12 +1,20 @@
+from collections import deque
+from itertools import islice
+
 from app.models.types import Word
 
 
 class HypothesisBuffer:
-
-    def __init__(self):
-        self.commited_in_buffer = []
-        self.buffer = []
-        self.new = []
+    # the longest n-gram of already commited words that is looked for at the beginning of a new hypothesis
+    max_ngram = 5
+
+    def __init__(self, time_tolerance=0.1):
+        # how far before the last commit a new word may start and still be considered new,
+        # words that were commited already are then removed by the n-gram comparison
+        self.time_tolerance = time_tolerance
+        self.commited_in_buffer = deque()
+        self.buffer = deque()
+        self.new = deque()
         self.last_commited_time = 0
         self.last_commited_word = None
 
@@ -14,19 +22,19 @@ class HypothesisBuffer:
         # compare self.commited_in_buffer and new. It inserts only the words in new that extend the commited_in_buffer,
         # it means they are roughly behind last_commited_time and new in content the new tail is added to self.new
 
-        new_time_cutoff = self.last_commited_time - 0.1 - offset
-        self.new = [word.add_offset(offset) for word in new if word.start > new_time_cutoff]
+        new_time_cutoff = self.last_commited_time - self.time_tolerance - offset
+        self.new = deque(word.add_offset(offset) for word in new if word.start > new_time_cutoff)
 
         if self.new and self.commited_in_buffer and abs(self.new[0].start - self.last_commited_time) < 1:
             # it's going to search for 1, 2, ..., 5 consecutive words (n-grams) that are identical in commited and new.
-            # If they are, they're dropped.# 5 is the maximum
-            identical_in_commited_will_compared = min(min(len(self.commited_in_buffer), len(self.new)), 5)
-
-            for i in range(1, identical_in_commited_will_compared + 1):
-                c = " ".join([self.commited_in_buffer[-j].word for j in range(1, i + 1)][::-1])
-                tail = " ".join(self.new[j - 1].word for j in range(1, i + 1))
-                if c == tail:
-                    self.new = self.new[i:]
+            # If they are, they're dropped. Only the ends of both deques are touched, so it doesn't depend on history
+            n = min(len(self.commited_in_buffer), len(self.new), self.max_ngram)
+            commited_tail = [w.word for w in islice(reversed(self.commited_in_buffer), n)][::-1]
+            new_head = [w.word for w in islice(self.new, n)]
+            for i in range(1, n + 1):
+                if commited_tail[-i:] == new_head[:i]:
+                    for _ in range(i):
+                        self.new.popleft()
                     break
 
     def flush(self):
@@ -38,18 +46,18 @@ class HypothesisBuffer:
                 commit.append(word)
                 self.last_commited_word = word.word
                 self.last_commited_time = word.end
-                self.buffer.pop(0)
-                self.new.pop(0)
+                self.buffer.popleft()
+                self.new.popleft()
             else:
                 break
         self.buffer = self.new
-        self.new = []
+        self.new = deque()
         self.commited_in_buffer.extend(commit)
         return commit
 
     def pop_commited(self, time):
         while self.commited_in_buffer and self.commited_in_buffer[0].end <= time:
-            self.commited_in_buffer.pop(0)
+            self.commited_in_buffer.popleft()
 
     def complete(self):
         return self.buffer
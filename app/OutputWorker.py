@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+
+from app.SpeculativeOutput import join_edits, split_edit
+from settings import Settings
+
+
+def send_text(text, poll_interval=0.05):
+    """Types text, leading backspace characters ('\b') are sent as Backspace presses first"""
+    import keyboard
+    # print(text or "", end="")
+    while keyboard.is_pressed('shift') or keyboard.is_pressed('ctrl') or keyboard.is_pressed('alt'):
+        time.sleep(poll_interval)
+    erase, text = split_edit(text)
+    for _ in range(erase):
+        keyboard.send('backspace')
+    keyboard.write(text)
+
+
+class OutputWorker:
+    """
+    Output stage: typing and clipboard work on its own thread behind a bounded queue.
+    Submitting never blocks the transcription: when the queue is full, items go to a spill list
+    that is coalesced (consecutive texts joined into one write) and handled once the queue drains.
+    """
+
+    metrics_writer = None
+
+    def __init__(self, settings: Settings, maxsize=8):
+        self.settings = settings
+        self.queue = queue.Queue(maxsize)
+        self._spill = []
+        self._spill_lock = threading.Lock()
+        self.max_depth = 0
+        self.backpressure = 0  # submissions that found the queue full
+        self.typed_chars = 0
+        self.typing_sec = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def type_text(self, text, spoken_at=None):
+        if text:
+            self._submit(('type', text, spoken_at))
+
+    def copy(self, text):
+        if text:
+            self._submit(('copy', text, None))
+
+    def _submit(self, item):
+        with self._spill_lock:
+            if self._spill:
+                self._spill.append(item)
+                self.backpressure += 1
+                return
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self._spill.append(item)
+                self.backpressure += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    @staticmethod
+    def coalesce(items):
+        merged = []
+        for kind, text, spoken_at in items:
+            if kind == 'type' and merged and merged[-1][0] == 'type':
+                # the oldest unspoken word is what the latency is measured for,
+                # corrections of speculative text cancel out against the text they erase
+                merged[-1] = ('type', join_edits(merged[-1][1], text), merged[-1][2] or spoken_at)
+            else:
+                merged.append((kind, text, spoken_at))
+        return merged
+
+    def _handle(self, item):
+        kind, text, spoken_at = item
+        if kind == 'copy':
+            import pyperclip
+            pyperclip.copy(text)
+            return
+        t = time.time()
+        send_text(text, self.settings.modifier_poll_sec)
+        self.typing_sec += time.time() - t
+        self.typed_chars += len(text)
+        if spoken_at is not None:
+            latency = time.time() - spoken_at
+            if self.settings.report_latency:
+                print(f" [latency {latency:.2f}s]", end="")
+            if self.metrics_writer is not None:
+                self.metrics_writer.write("output", chars=len(text), latency_sec=round(latency, 3),
+                                          depth=self.queue.qsize())
+        if self.settings.after_typing_pause_sec:
+            time.sleep(self.settings.after_typing_pause_sec)
+
+    def _run(self):
+        while True:
+            try:
+                self._handle(self.queue.get(timeout=0.2))
+            except queue.Empty:
+                pass
+            with self._spill_lock:
+                spilled = []
+                if self._spill and self.queue.empty():
+                    spilled, self._spill = self._spill, []
+            for item in self.coalesce(spilled):
+                self._handle(item)
+
+    def metrics(self):
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "spilled": len(self._spill),
+            "backpressure": self.backpressure,
+            "typed_chars": self.typed_chars,
+            "typing_sec": round(self.typing_sec, 3),
+        }
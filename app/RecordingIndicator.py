@@ -1,11 +1,17 @@
+import queue
 import tkinter as tk
 from datetime import datetime
 
 
 class RecordingIndicator:
+    """
+    Tk is not thread-safe: show(), hide() and stop_recording() may be called from any thread, they only post
+    a command, the Tk thread picks the commands up every poll_ms with root.after and runs them.
+    """
     size = 56
     default_color = 'red'
     stop_color = 'blue'
+    poll_ms = 30
 
     def __init__(self):
         self.root = tk.Tk()
@@ -34,6 +40,9 @@ class RecordingIndicator:
         self.root.geometry(f"{self.root_size}x{self.root_size}")
         self.root.withdraw()
         self.start_time = None
+        self._timer_id = None
+        self._commands = queue.SimpleQueue()
+        self.root.after(self.poll_ms, self._drain)
 
         # Event handlers for moving the window
         self.canvas.bind("<Button-1>", self.start_move)
@@ -53,14 +62,46 @@ class RecordingIndicator:
         y = self.root.winfo_y() + dy
         self.root.geometry(f"+{x}+{y}")
 
+    def _drain(self):
+        while True:
+            try:
+                command, args = self._commands.get_nowait()
+            except queue.Empty:
+                break
+            command(*args)
+        self.root.after(self.poll_ms, self._drain)
+
+    def _post(self, command, *args):
+        self._commands.put((command, args))
+
+    def _cancel_timer(self):
+        if self._timer_id is not None:
+            self.root.after_cancel(self._timer_id)
+            self._timer_id = None
+
     def update_time(self):
+        self._timer_id = None
         if self.start_time:
             elapsed_time = datetime.now() - self.start_time
             mins, secs = divmod(elapsed_time.seconds, 60)
             self.canvas.itemconfig(self.timer_label, text=f"{mins:02}:{secs:02}")
-            self.root.after(1000, self.update_time)
+            # to the next whole second, so the timer does not drift
+            self._timer_id = self.root.after(1000 - elapsed_time.microseconds // 1000, self.update_time)
 
     def show(self, x, y):
+        self._post(self._show, x, y)
+
+    def hide(self):
+        self._post(self._hide)
+
+    def stop_recording(self):
+        self._post(self._stop_recording)
+
+    def quit(self):
+        """Ends root.mainloop(), e.g. when the transcription thread cannot start"""
+        self._post(self.root.quit)
+
+    def _show(self, x, y):
         self.canvas.itemconfig(self.timer_label, text="00:00")
         self.canvas.itemconfig(self.circle, fill=self.default_color)
         self.start_time = datetime.now()
@@ -74,11 +115,13 @@ class RecordingIndicator:
 
         self.root.geometry(f'+{adjusted_x}+{adjusted_y}')
         self.root.deiconify()
+        self._cancel_timer()
         self.update_time()
 
-    def hide(self):
+    def _hide(self):
+        self._cancel_timer()
         self.root.withdraw()
         self.start_time = None
 
-    def stop_recording(self):
+    def _stop_recording(self):
         self.canvas.itemconfig(self.circle, fill=self.stop_color)
@@ -0,0 +1,91 @@
+import socket
+import time
+
+import numpy as np
+
+from app.ASRServer import AUDIO, FINISH, GET_ALL, HEADER, ITERATE, TEXT, pack_frame
+
+
+class RemoteProcessor:
+    """
+    Thin client of ASRServer with the ASRProcessor interface used by main.py,
+    so the hotkey tool can work without loading a model in-process.
+    A lost connection (server down, timeout) is not fatal: requests return no text and the client reconnects,
+    at most every reconnect_sec, the server then starts a new session.
+    """
+
+    def __init__(self, address: str, timeout=60.0, reconnect_sec=2.0):
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.timeout = timeout
+        self.reconnect_sec = reconnect_sec
+        self.sock = None
+        self._retry_at = 0.0
+        # the first connection fails loudly, the caller reports it
+        self.connect()
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _lost(self, error):
+        if self.sock is not None:
+            print(f"ASR server connection lost: {error!r}, reconnecting")
+            self.sock.close()
+            self.sock = None
+            self._retry_at = time.time() + self.reconnect_sec
+
+    def _send(self, frame):
+        if self.sock is None:
+            if time.time() < self._retry_at:
+                raise ConnectionError("ASR server is not connected")
+            self._retry_at = time.time() + self.reconnect_sec
+            self.connect()
+            print("ASR server connection restored")
+        self.sock.sendall(frame)
+
+    def _recv_exact(self, n):
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("ASR server closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def _request(self, kind):
+        try:
+            self._send(pack_frame(kind))
+            reply, length = HEADER.unpack(self._recv_exact(HEADER.size))
+            payload = self._recv_exact(length)
+        except OSError as e:
+            # a reply cut by a timeout leaves the stream out of sync, the connection is dropped in any case
+            self._lost(e)
+            return ""
+        assert reply == TEXT, reply
+        return payload.decode('utf8')
+
+    def insert_audio_chunk(self, audio):
+        if len(audio):
+            pcm = (np.clip(audio, -1, 1) * 32767).astype('<i2')
+            try:
+                self._send(pack_frame(AUDIO, pcm.tobytes()))
+            except OSError as e:
+                self._lost(e)
+
+    def process_iter(self):
+        return self._request(ITERATE)
+
+    def gel_all_text(self):
+        return self._request(GET_ALL)
+
+    def remove_stop_phrases(self, text):
+        # the server filters the text already
+        return text
+
+    def finish(self):
+        return self._request(FINISH)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
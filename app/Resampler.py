@@ -0,0 +1,52 @@
+from math import ceil, gcd
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler (out_rate/in_rate = up/down): a Kaiser-windowed sinc low-pass split into
+    `up` polyphase branches, only the output samples are computed, never the up-sampled signal.
+    Blocks of any size can be fed, the filter history and the output phase carry over between calls,
+    so the output is the same as resampling the whole signal at once.
+    """
+
+    def __init__(self, in_rate, out_rate=16000, zero_crossings=16, beta=8.0):
+        g = gcd(int(in_rate), int(out_rate))
+        self.up, self.down = int(out_rate) // g, int(in_rate) // g
+        # taps per branch: the low-pass cutoff is the lower of the two Nyquist rates
+        ratio = max(1.0, self.down / self.up)
+        self.taps = 2 * zero_crossings * ceil(ratio)
+        n = np.arange(self.up * self.taps) - (self.up * self.taps - 1) / 2
+        cutoff = 0.5 / max(self.up, self.down)
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(len(n), beta) * self.up
+        # bank[p] are the taps of branch p, reversed to run over the ascending input window
+        self.bank = prototype.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32).copy()
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # position of the next output sample past the newest history sample, in 1/up input samples
+        self._pos = 0
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def output_length(self, n_in):
+        return max(0, ceil((n_in * self.up - self._pos) / self.down))
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float32)
+        if self.passthrough:
+            return block
+        n_out = self.output_length(len(block))
+        x = np.concatenate((self._history, block))
+        out = np.empty(0, dtype=np.float32)
+        if n_out:
+            positions = self._pos + np.arange(n_out) * self.down
+            windows = np.lib.stride_tricks.sliding_window_view(x, self.taps)[positions // self.up]
+            out = np.einsum('ij,ij->i', windows, self.bank[positions % self.up])
+        self._pos += n_out * self.down - len(block) * self.up
+        self._history = x[len(x) - self.taps + 1:]
+        return out
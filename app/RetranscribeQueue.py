@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app.FileTranscriber import split_on_silence
+from app.SessionJournal import SessionReader
+from app.StopPhraseFilter import StopPhraseMatcher, StopPhraseFilter
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+THREAD_PRIORITY_IDLE = -15  # winbase.h
+
+
+def lower_thread_priority(niceness=19):
+    """Idle priority for the calling thread: SetThreadPriority on Windows, on Linux threads have their own nice value.
+    Elsewhere (macOS: setpriority applies to the whole process) the priority stays as it is"""
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_IDLE)
+    elif sys.platform.startswith('linux') and hasattr(threading, 'get_native_id'):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+        except OSError:
+            pass
+
+
+class RetranscribeQueue:
+    """
+    Second pass over finished journal sessions with a slower, more accurate model.
+    Jobs are kept in a JSON file rewritten on every change, unfinished ones are picked up again after a restart.
+    Workers run at idle priority and start a job, and every next chunk of it, only while is_idle() is true
+    and the queue is not paused, so they do not compete with the live process_iter.
+    A chunk that is already decoding is not interrupted, chunks are short (max_chunk_sec) for that reason.
+    The result is written to final.txt in the session folder and handed to on_done(session, text).
+    Only the last keep_finished done or failed jobs stay in the file, jobs of deleted sessions are dropped on load.
+    """
+
+    def __init__(self, jobs_file, cache, model_config: dict, workers=1, is_idle=lambda: True, on_done=None,
+                 max_chunk_sec=15.0, idle_poll_sec=0.5, keep_finished=100):
+        self.jobs_file = Path(jobs_file)
+        self.cache = cache
+        self.model_config = model_config
+        self.is_idle = is_idle
+        self.on_done = on_done
+        self.max_chunk_sec = max_chunk_sec
+        self.idle_poll_sec = idle_poll_sec
+        self.keep_finished = keep_finished
+        self._cond = threading.Condition()
+        self._paused = False
+        self.jobs = self._load()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f'retranscribe {i}', daemon=True).start()
+
+    def _load(self):
+        if not self.jobs_file.exists():
+            return []
+        jobs = json.loads(self.jobs_file.read_text(encoding='utf8'))
+        for job in jobs:
+            if job['state'] == RUNNING:
+                job['state'] = PENDING  # interrupted by the exit
+        # the journal deletes old sessions by itself
+        return self._prune([job for job in jobs if Path(job['session']).exists()])
+
+    def _prune(self, jobs):
+        """The jobs without the finished ones older than the last keep_finished"""
+        finished = [job for job in jobs if job['state'] in (DONE, FAILED)]
+        if len(finished) <= self.keep_finished:
+            return jobs
+        dropped = {id(job) for job in finished[:len(finished) - self.keep_finished]}
+        return [job for job in jobs if id(job) not in dropped]
+
+    def _save(self):
+        # called under the lock; replace, so a crash leaves either the old or the new file
+        self.jobs_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.jobs_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.jobs, ensure_ascii=False, indent=1), encoding='utf8')
+        os.replace(tmp, self.jobs_file)
+
+    def submit(self, session):
+        with self._cond:
+            self.jobs.append({"session": str(session), "state": PENDING, "submitted": round(time.time(), 3)})
+            self._save()
+            self._cond.notify()
+
+    def pause(self):
+        with self._cond:
+            self._paused = True
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def pending(self):
+        with self._cond:
+            return sum(job['state'] == PENDING for job in self.jobs)
+
+    def _wait_turn(self):
+        """Blocks while paused or while the live dictation runs"""
+        while True:
+            with self._cond:
+                while self._paused:
+                    self._cond.wait()
+            if self.is_idle():
+                return
+            time.sleep(self.idle_poll_sec)
+
+    def _take(self):
+        with self._cond:
+            while True:
+                job = next((j for j in self.jobs if j['state'] == PENDING), None) if not self._paused else None
+                if job is not None:
+                    job['state'] = RUNNING
+                    self._save()
+                    return job
+                self._cond.wait()
+
+    def _finish(self, job, state, **fields):
+        with self._cond:
+            job.update(state=state, finished=round(time.time(), 3), **fields)
+            self.jobs = self._prune(self.jobs)
+            self._save()
+
+    def transcribe(self, session):
+        reader = SessionReader(session)
+        audio = reader.audio()
+        rate = reader.meta.get('sample_rate', 16000)
+        # _take() may have waited for the job while a recording started, loading a model then would stall it
+        self._wait_turn()
+        asr = self.cache.get(**self.model_config)
+        words = []
+        for begin, end in split_on_silence(audio, rate, self.max_chunk_sec):
+            self._wait_turn()
+            chunk_words, _ = asr.transcribe(audio[begin:end])
+            words.extend(w.add_offset(begin / rate) for w in chunk_words)
+        text = asr.sep.join(w.word for w in words).strip()
+        return StopPhraseFilter(StopPhraseMatcher(asr.STOP_PHRASES)).remove(text)
+
+    def _run(self):
+        lower_thread_priority()
+        while True:
+            self._wait_turn()
+            job = self._take()
+            t = time.time()
+            try:
+                text = self.transcribe(job['session'])
+            except Exception as e:
+                print(f"re-transcription of {job['session']} failed: {e!r}")
+                self._finish(job, FAILED, error=repr(e))
+                continue
+            (Path(job['session']) / 'final.txt').write_text(text, encoding='utf8')
+            self._finish(job, DONE, seconds=round(time.time() - t, 2))
+            if self.on_done is not None:
+                self.on_done(job['session'], text)
@@ -0,0 +1,216 @@
+import json
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+import wave
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+from app.models.types import Word
+
+# words.idx record: word start (processor time) and the byte offset of its line in words.jsonl
+INDEX_RECORD = struct.Struct('<dQ')
+
+
+class SessionJournal:
+    """
+    Append-only journal of dictation sessions: <root>/<YYYYmmdd-HHMMSS-ms>/ with
+        audio.wav    16-bit mono audio exactly as it was given to ASRProcessor, so word times match it
+        words.jsonl  commited words, one JSON object per line
+        words.idx    fixed-size (start, line offset) records for binary search by time
+        meta.json    settings of the session, text.txt - the final text
+    All writes happen on a background thread behind a bounded queue, the hot path only enqueues.
+    Files are flushed and fsync'ed every flush_sec, so a crash loses at most that much.
+    If the disk stalls and the queue is full, items are dropped and counted instead of blocking recognition.
+    After every session the oldest ones are deleted while the journal is over max_bytes or older than max_age_sec.
+    """
+
+    on_closed = None  # called from the writer thread with the path of every session once its files are complete
+
+    def __init__(self, root, sampling_rate=16000, max_queue=256, flush_sec=1.0, max_bytes=None, max_age_sec=None):
+        self.root = Path(root)
+        self.sampling_rate = sampling_rate
+        self.flush_sec = flush_sec
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.pruned = 0
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.path = None
+        self._files = None
+        threading.Thread(target=self._run, name='journal', daemon=True).start()
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def begin(self, **meta):
+        now = time.time()
+        name = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"-{int(now * 1000) % 1000:03}"
+        self.path = self.root / name
+        self._put(('begin', (self.path, {"started": now, "sample_rate": self.sampling_rate, **meta})))
+        return self.path
+
+    def audio(self, audio):
+        if len(audio):
+            # converted here: the capture hands out views of a reused buffer
+            self._put(('audio', (np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes()))
+
+    def words(self, words):
+        if words:
+            self._put(('words', [(w.start, w.end, w.word, w.probability) for w in words]))
+
+    def end(self, text=""):
+        self._put(('end', text))
+
+    # ---------- writer thread ---------- #
+    def _open(self, path, meta):
+        self._close()
+        path.mkdir(parents=True, exist_ok=True)
+        (path / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding='utf8')
+        audio_file = open(path / 'audio.wav', 'wb')
+        wav = wave.open(audio_file, 'wb')
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(self.sampling_rate)
+        self._files = {
+            'path': path,
+            'wav': wav,
+            'audio': audio_file,
+            'words': open(path / 'words.jsonl', 'ab'),
+            'index': open(path / 'words.idx', 'ab'),
+        }
+
+    def _write_words(self, words):
+        f = self._files
+        for start, end, word, probability in words:
+            offset = f['words'].tell()
+            line = json.dumps({"start": round(start, 3), "end": round(end, 3), "word": word,
+                               "probability": round(probability, 4)}, ensure_ascii=False)
+            f['words'].write(line.encode('utf8') + b'\n')
+            # the index record goes after its line, so it never points past the end of words.jsonl
+            f['index'].write(INDEX_RECORD.pack(start, offset))
+
+    def _flush(self):
+        if self._files is None:
+            return
+        # wave patches the header sizes on every writeframes, the file is valid up to the last flush
+        for name in ('audio', 'words', 'index'):
+            f = self._files[name]
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _close(self, text=""):
+        if self._files is None:
+            return
+        if text:
+            (self._files['path'] / 'text.txt').write_text(text, encoding='utf8')
+        self._flush()
+        self._files['wav'].close()
+        self._files['audio'].close()
+        self._files['words'].close()
+        self._files['index'].close()
+        path, self._files = self._files['path'], None
+        if self.on_closed is not None:
+            self.on_closed(path)
+        self.prune()
+
+    def prune(self):
+        """Deletes the oldest finished sessions past the size and age limits, the open one is kept"""
+        if self.max_bytes is None and self.max_age_sec is None or not self.root.exists():
+            return
+        open_path = self._files['path'] if self._files is not None else None
+        sessions = [p for p in SessionReader.sessions(self.root) if p != open_path]
+        sizes = {p: sum(f.stat().st_size for f in p.iterdir() if f.is_file()) for p in sessions}
+        total = sum(sizes.values())
+        now = time.time()
+        for path in sessions:  # the names sort by time, oldest first
+            too_old = self.max_age_sec is not None and now - (path / 'meta.json').stat().st_mtime > self.max_age_sec
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not too_old and not too_big:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+            self.pruned += 1
+
+    def _run(self):
+        self.prune()
+        last_flush = time.time()
+        while True:
+            try:
+                kind, payload = self.queue.get(timeout=self.flush_sec)
+            except queue.Empty:
+                kind = None
+            if kind == 'begin':
+                self._open(*payload)
+            elif self._files is not None:
+                if kind == 'audio':
+                    self._files['wav'].writeframes(payload)
+                elif kind == 'words':
+                    self._write_words(payload)
+                elif kind == 'end':
+                    self._close(payload)
+            if time.time() - last_flush >= self.flush_sec:
+                self._flush()
+                last_flush = time.time()
+
+
+class SessionReader:
+    """Reads a journaled session back: words, search by text or time, audio of any span"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / 'meta.json').read_text(encoding='utf8'))
+        data = (self.path / 'words.idx').read_bytes()
+        # a record cut by a crash is ignored
+        records = [INDEX_RECORD.unpack_from(data, i) for i in range(0, len(data) - INDEX_RECORD.size + 1,
+                                                                   INDEX_RECORD.size)]
+        self.starts = [start for start, _ in records]
+        self.offsets = [offset for _, offset in records]
+
+    def _read_word(self, f, offset):
+        f.seek(offset)
+        w = json.loads(f.readline())
+        return Word(w['start'], w['end'], w['word'], w['probability'])
+
+    def words(self, start=0.0, end=float('inf')) -> list[Word]:
+        """Words that begin within [start, end), found through the index without reading the whole file"""
+        result = []
+        with open(self.path / 'words.jsonl', 'rb') as f:
+            for i in range(bisect_left(self.starts, start), len(self.offsets)):
+                if self.starts[i] >= end:
+                    break
+                try:
+                    result.append(self._read_word(f, self.offsets[i]))
+                except ValueError:
+                    break  # the line was cut by a crash
+        return result
+
+    def text(self, sep=""):
+        text_file = self.path / 'text.txt'
+        if text_file.exists():
+            return text_file.read_text(encoding='utf8')
+        return sep.join(w.word for w in self.words()).strip()
+
+    def search(self, phrase) -> list[Word]:
+        """Words that contain the phrase (case-insensitive), with their times for playback or re-transcription"""
+        phrase = phrase.lower()
+        return [w for w in self.words() if phrase in w.word.lower()]
+
+    def audio(self, start=0.0, end=None) -> np.ndarray:
+        with wave.open(str(self.path / 'audio.wav'), 'rb') as wav:
+            rate = wav.getframerate()
+            wav.setpos(min(int(start * rate), wav.getnframes()))
+            n = wav.getnframes() - wav.tell() if end is None else int((end - start) * rate)
+            return np.frombuffer(wav.readframes(n), dtype='<i2').astype(np.float32) / 32768
+
+    @staticmethod
+    def sessions(root):
+        return sorted(p for p in Path(root).iterdir() if (p / 'meta.json').exists())
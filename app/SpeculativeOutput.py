@@ -0,0 +1,85 @@
+BACKSPACE = '\b'
+
+
+def common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def word_edits(old: list[str], new: list[str]) -> int:
+    """
+    Word-level Levenshtein distance from old to the closest prefix of new: how many words of the old hypothesis
+    were substituted, dropped or had words inserted between them. Words only appended after it are not edits.
+    """
+    previous = list(range(len(new) + 1))
+    for i, old_word in enumerate(old, 1):
+        current = [i]
+        for j, new_word in enumerate(new, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (old_word != new_word)))
+        previous = current
+    return min(previous)
+
+
+def split_edit(edit: str):
+    """An edit is text to type after some backspaces: '\\b\\bxy' -> (2, 'xy')"""
+    text = edit.lstrip(BACKSPACE)
+    return len(edit) - len(text), text
+
+
+def apply_edit(text: str, edit: str) -> str:
+    erase, typed = split_edit(edit)
+    return text[:max(len(text) - erase, 0)] + typed
+
+
+def join_edits(first: str, second: str) -> str:
+    """Two edits typed one after another as one: backspaces of the second erase the end of the first"""
+    erase1, text1 = split_edit(first)
+    erase2, text2 = split_edit(second)
+    if erase2 <= len(text1):
+        return BACKSPACE * erase1 + text1[:len(text1) - erase2] + text2
+    return BACKSPACE * (erase1 + erase2 - len(text1)) + text2
+
+
+class SpeculativeOutput:
+    """
+    Keeps the typed text in line with the unconfirmed hypothesis: the commited text is typed once and for good,
+    after it the speculative tail (HypothesisBuffer.complete()) is shown right away. When the next iteration
+    changes its mind, the screen is fixed with the least keystrokes possible with the cursor at the end:
+    backspaces up to the first differing character, then the new ending.
+    """
+
+    def __init__(self):
+        self.shown = ""  # speculative text on the screen after the commited text
+        self.typed_chars = 0
+        self.corrected_chars = 0  # erased with backspace
+        self.corrections = 0  # updates that had to erase something
+        self.word_edits = 0  # words substituted, inserted or dropped by the corrections
+
+    def reset(self):
+        self.shown = ""
+
+    def update(self, commited: str, speculative: str) -> str:
+        """commited: newly commited text, speculative: the unconfirmed tail after it. Returns the edit to type"""
+        target = commited + speculative
+        keep = common_prefix(self.shown, target)
+        erase = len(self.shown) - keep
+        if erase:
+            self.corrections += 1
+            self.corrected_chars += erase
+            self.word_edits += word_edits(self.shown.split(), target.split())
+        self.typed_chars += len(target) - keep
+        self.shown = speculative
+        return BACKSPACE * erase + target[keep:]
+
+    def metrics(self):
+        return {
+            "typed_chars": self.typed_chars,
+            "corrected_chars": self.corrected_chars,
+            "corrections": self.corrections,
+            "word_edits": self.word_edits,
+            # share of the typed characters that had to be erased again
+            "correction_rate": round(self.corrected_chars / self.typed_chars, 4) if self.typed_chars else 0.0,
+        }
@@ -0,0 +1,152 @@
+from collections import deque
+
+
+def fold(ch):
+    lower = ch.lower()
+    # keep the 1:1 mapping between the text and the automaton input
+    return lower if len(lower) == 1 else ch
+
+
+class StopPhraseMatcher:
+    """
+    Aho-Corasick automaton over case-folded characters, built once from any number of phrases.
+    match[state] is the length of the longest phrase ending in the state, matches[state] - the lengths of all
+    of them, longest first. depth[state] is the length of the longest text suffix that is still a prefix
+    of some phrase, the shorter ones are the depths along the fail links.
+    """
+
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.fail = [0]
+        self.match = [0]
+        self.matches = [()]
+        self.depth = [0]
+        for phrase in phrases:
+            phrase = ''.join(map(fold, phrase.strip()))
+            if not phrase:
+                continue
+            state = 0
+            for ch in phrase:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.match.append(0)
+                    self.matches.append(())
+                    self.depth.append(self.depth[state] + 1)
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.match[state] = len(phrase)
+
+        queue = deque(self.goto[0].values())
+        for state in queue:
+            self.matches[state] = (self.match[state],) if self.match[state] else ()
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                self.fail[nxt] = self.step(self.fail[state], ch)
+                own = (self.match[nxt],) if self.match[nxt] else ()
+                self.matches[nxt] = own + self.matches[self.fail[nxt]]
+                self.match[nxt] = self.match[nxt] or self.match[self.fail[nxt]]
+
+    def step(self, state, ch):
+        while state and ch not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(ch, 0)
+
+
+class StopPhraseFilter:
+    """
+    Streaming removal of stop phrases from text fed in pieces, in time linear in the text.
+    A phrase split between two pieces is still removed: only the minimal ambiguous suffix
+    (the part that may still become a phrase, plus whitespace before it) is held back until the next feed().
+    Phrases match whole words only: a phrase, and so a held back suffix, begins at the start of the text,
+    after a non-alphanumeric character or right where a removed phrase was, a word is never split between feeds.
+    Like the former regex `\\s*(phrase)\\s*\\.*`, whitespace before a phrase and dots after it are removed too.
+    """
+
+    def __init__(self, matcher: StopPhraseMatcher):
+        self.matcher = matcher
+        self.reset()
+
+    def reset(self):
+        self.state = 0
+        self.pending = []
+        self.candidate = None  # (begin, end) in pending of the leftmost-longest match found so far
+        self.skip_dots = False
+        self.at_boundary = True  # pending[0] begins a word: the start of the text or after a non-word character
+        self.after_phrase = None  # index in pending where a removed phrase was, also a word boundary
+
+    def _boundary(self, i):
+        if i == self.after_phrase:
+            return True
+        return self.at_boundary if i == 0 else not self.pending[i - 1].isalnum()
+
+    def _live(self):
+        """Start in pending of the longest suffix that begins a word and may still grow into a phrase"""
+        m, n, state = self.matcher, len(self.pending), self.state
+        while state and not self._boundary(n - m.depth[state]):
+            state = m.fail[state]
+        return n - m.depth[state]
+
+    def _commit(self):
+        begin, end = self.candidate
+        leftover = self.pending[end:]
+        del self.pending[begin:]
+        while self.pending and self.pending[-1].isspace():
+            self.pending.pop()
+        self.after_phrase = len(self.pending)
+        self.candidate = None
+        self.state = 0
+        self.skip_dots = True
+        return leftover
+
+    def feed(self, text) -> str:
+        m = self.matcher
+        chars = deque(text)
+        while chars:
+            ch = chars.popleft()
+            if self.skip_dots:
+                if ch == '.':
+                    continue
+                self.skip_dots = False
+            self.state = m.step(self.state, fold(ch))
+            self.pending.append(ch)
+            # the longest phrase ending here that begins a word
+            begin = next((begin for begin in (len(self.pending) - length for length in m.matches[self.state])
+                          if self._boundary(begin)), None)
+            if begin is not None and (self.candidate is None or begin <= self.candidate[0]):
+                self.candidate = (begin, len(self.pending))
+            # the candidate can no longer grow into a longer phrase - remove it and rescan what followed it
+            if self.candidate and self._live() > self.candidate[0]:
+                chars.extendleft(reversed(self._commit()))
+
+        cut = self._live()
+        if self.candidate:
+            cut = min(cut, self.candidate[0])
+        while cut > 0 and self.pending[cut - 1].isspace():
+            cut -= 1
+        if cut:
+            self.at_boundary = self._boundary(cut)
+        out = ''.join(self.pending[:cut])
+        del self.pending[:cut]
+        if self.candidate:
+            self.candidate = (self.candidate[0] - cut, self.candidate[1] - cut)
+        if self.after_phrase is not None:
+            self.after_phrase = self.after_phrase - cut if self.after_phrase > cut else None
+        return out
+
+    def flush(self) -> str:
+        out = []
+        while self.candidate is not None:
+            out.append(self.feed(''.join(self._commit())))
+        out.append(''.join(self.pending))
+        self.reset()
+        return ''.join(out)
+
+    def remove(self, text) -> str:
+        """One-shot filtering of a complete text, the streaming state is not touched"""
+        f = StopPhraseFilter(self.matcher)
+        return f.feed(text) + f.flush()
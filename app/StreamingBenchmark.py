@@ -0,0 +1,203 @@
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+from app.ASRProcessor import ASRProcessor
+from app.SpeculativeOutput import SpeculativeOutput, apply_edit
+
+
+def load_wav(path, sampling_rate=16000):
+    """Mono 16-bit WAV at the model sampling rate, other formats go through librosa"""
+    try:
+        with wave.open(str(path), 'rb') as f:
+            if f.getframerate() == sampling_rate and f.getsampwidth() == 2 and f.getnchannels() == 1:
+                return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).astype(np.float32) / 32768
+    except wave.Error:
+        pass
+    from app.FileTranscriber import load_audio
+    return load_audio(path, sampling_rate)
+
+
+def percentiles(values):
+    values = np.array(values) if len(values) else np.zeros(1)
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def stable_delays(snapshots, final_words, word_ends):
+    """
+    For speculative output: how long after a word was spoken it appeared on the screen for good,
+    i.e. the time of the snapshot from which on the word stays as in the final text.
+    snapshots: [(time, words on the screen)], in time order
+    """
+    stable_since = [None] * len(final_words)
+    settled = [True] * len(final_words)
+    for t, words in reversed(snapshots):
+        for i, final in enumerate(final_words):
+            if settled[i] and i < len(words) and words[i] == final:
+                stable_since[i] = t
+            else:
+                settled[i] = False
+    return [since - end for since, end in zip(stable_since, word_ends) if since is not None]
+
+
+def align_words(reference: list[str], output: list[str]):
+    """Levenshtein alignment of two word sequences: (edit distance, [(reference index, output index)] of equal words)"""
+    n, m = len(reference), len(output)
+    cost = np.zeros((n + 1, m + 1), dtype=np.int32)
+    cost[:, 0] = np.arange(n + 1)
+    cost[0, :] = np.arange(m + 1)
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost[i, j] = min(cost[i - 1, j] + 1, cost[i, j - 1] + 1,
+                             cost[i - 1, j - 1] + (reference[i - 1] != output[j - 1]))
+    pairs, i, j = [], n, m
+    while i and j:
+        if cost[i, j] == cost[i - 1, j - 1] + (reference[i - 1] != output[j - 1]):
+            if reference[i - 1] == output[j - 1]:
+                pairs.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif cost[i, j] == cost[i - 1, j] + 1:
+            i -= 1
+        else:
+            j -= 1
+    return int(cost[n, m]), pairs[::-1]
+
+
+def commit_accuracy(reference, output):
+    """Word error rate of the output against the script, and how far the output word end times are off"""
+    distance, pairs = align_words([w.word.strip().lower() for w in reference],
+                                  [w.word.strip().lower() for w in output])
+    return {
+        "wer": round(distance / len(reference), 4) if reference else 0.0,
+        "end_time_error_sec": percentiles([abs(output[j].end - reference[i].end) for i, j in pairs]),
+    }
+
+
+def synthetic_audio(duration, sampling_rate=16000, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(duration * sampling_rate)) * 0.01).astype(np.float32)
+
+
+class StreamingBenchmark:
+    """
+    Feeds audio through ASRProcessor on a simulated clock: audio "arrives" in real time,
+    every iteration takes the time the ASR spent on it (measured wall time for a real model,
+    the cost model of ScriptedASR for the stub), the next iteration starts as soon as
+    min_chunk_sec of new audio is available. Nothing sleeps, so a 10-minute recording with the stub runs in seconds.
+    """
+
+    def __init__(self, asr, audio, sampling_rate=16000, min_chunk_sec=1.0, simulated_cost=None, scheduler=None,
+                 speculative=False, detector=None):
+        self.asr = asr
+        self.audio = audio
+        self.sampling_rate = sampling_rate
+        self.min_chunk_sec = min_chunk_sec
+        # AdaptiveScheduler, when given, picks the chunk size instead of the fixed min_chunk_sec
+        self.scheduler = scheduler
+        # also type the unconfirmed hypothesis (SpeculativeOutput) and measure when words settle on the screen
+        self.speculative = SpeculativeOutput() if speculative else None
+        # HallucinationDetector for the processor, its retries are paid on the clock like any decode
+        self.detector = detector
+        # use asr.last_decode_sec as iteration time instead of the measured wall time
+        self.simulated_cost = hasattr(asr, 'last_decode_sec') if simulated_cost is None else simulated_cost
+
+    def make_processor(self):
+        processor = ASRProcessor(self.asr, self.sampling_rate)
+        processor.hallucination_detector = self.detector
+        if hasattr(self.asr, 'processor'):
+            self.asr.processor = processor
+        return processor
+
+    def run(self):
+        processor = self.make_processor()
+        duration = len(self.audio) / self.sampling_rate
+        iterations, commit_delays = [], []
+        now = fed = 0.0
+        decode_total = 0.0
+
+        tracemalloc.start()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        chunk_sec = self.min_chunk_sec
+        screen, snapshots = "", []
+        while fed < duration:
+            now = max(now, min(fed + chunk_sec, duration))
+            arrived = min(now, duration)
+            processor.insert_audio_chunk(self.audio[int(fed * self.sampling_rate):int(arrived * self.sampling_rate)])
+            fed = arrived
+
+            committed_before = len(processor.commited)
+            buffer_sec = len(processor.audio_buffer) / self.sampling_rate
+            retried = processor.retry_options is not None
+            t = time.perf_counter()
+            o = processor.process_iter()
+            wall = time.perf_counter() - t
+            decode = self.asr.last_decode_sec if self.simulated_cost else wall
+            decode_total += decode
+            now += decode
+            if self.scheduler is not None:
+                self.scheduler.on_iteration(decode, processor)
+                chunk_sec = self.scheduler.next_chunk_sec()
+
+            if self.speculative is not None:
+                screen = apply_edit(screen, self.speculative.update(o, processor.speculative()))
+                snapshots.append((now, screen.split()))
+
+            new_words = processor.commited[committed_before:]
+            commit_delays.extend(now - w.end for w in new_words)
+            iterations.append({
+                "t": round(now, 3),
+                "buffer_sec": round(buffer_sec, 3),
+                "trimming_sec": processor.buffer_trimming_sec,
+                "decode_sec": round(decode, 4),
+                "wall_sec": round(wall, 4),
+                "latency_sec": round(now - fed, 3),
+                "words_committed": len(new_words),
+                "retried": retried,
+            })
+        words_committed = len(processor.commited)
+        output_words = list(processor.commited) + list(processor.transcript_buffer.complete())
+        word_ends = [w.end for w in output_words]
+        tail = processor.finish()
+        speculative = None
+        if self.speculative is not None:
+            screen = apply_edit(screen, self.speculative.update(tail, ""))
+            snapshots.append((now, screen.split()))
+            speculative = {
+                "visible_delay_sec": percentiles(stable_delays(snapshots, screen.split(), word_ends)),
+                **self.speculative.metrics(),
+            }
+        wall_total = time.perf_counter() - wall_start
+        cpu_total = time.process_time() - cpu_start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "audio_sec": round(duration, 3),
+            "iterations": len(iterations),
+            "rtf": round(decode_total / duration, 4) if duration else 0.0,
+            "wall_sec": round(wall_total, 4),
+            "cpu_sec": round(cpu_total, 4),
+            "peak_memory_mb": round(peak / 2 ** 20, 3),
+            "words_committed": words_committed,
+            "tail_chars": len(tail),
+            "commit_delay_sec": percentiles(commit_delays),
+            # against the script of the stub ASR
+            "accuracy": commit_accuracy([w for w in self.asr.words if w.end <= duration], output_words)
+            if hasattr(self.asr, 'words') else None,
+            "speculative": speculative,
+            "hallucinations": {**self.detector.stats(), "retries": sum(i["retried"] for i in iterations)}
+            if self.detector is not None else None,
+            "iteration_latency_sec": {
+                "mean": round(float(np.mean([i["latency_sec"] for i in iterations])), 3) if iterations else 0.0,
+                "max": round(max((i["latency_sec"] for i in iterations), default=0.0), 3),
+            },
+            "per_iteration": iterations,
+        }
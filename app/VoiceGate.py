@@ -0,0 +1,93 @@
+from bisect import bisect_right
+from collections import deque
+
+import numpy as np
+
+
+class VoiceGate:
+    """
+    Lightweight streaming energy VAD between the capture and ASRProcessor.insert_audio_chunk.
+    Frames louder than the adaptive noise floor (and the absolute threshold) are speech.
+    Silence longer than keep_silence_sec is dropped, keeping keep_silence_sec on both sides of the speech,
+    so the model still sees the pause, but never transcribes long silence.
+    """
+
+    def __init__(self, sampling_rate, threshold_db=-50.0, margin_db=12.0, keep_silence_sec=0.5, frame_sec=0.03):
+        self.sampling_rate = sampling_rate
+        self.frame = int(frame_sec * sampling_rate)
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.keep_samples = int(keep_silence_sec * sampling_rate)
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = self.threshold_db
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._preroll = deque(maxlen=max(self.keep_samples // self.frame, 1))
+        self._silence_run = 0
+        self._pending_iterations = 0
+        self.silence_sec = 0.0
+        self.dropped_sec = 0.0
+        # where the dropped silence was in the output: output sample position -> samples dropped before it,
+        # one entry per pause, maps processor time back to capture time
+        self._emitted = 0
+        self._gaps_at = []
+        self._gaps_dropped = []
+
+    @staticmethod
+    def frame_levels(frames: np.ndarray):
+        return 10 * np.log10(np.mean(np.square(frames), axis=1) + 1e-10)
+
+    def feed(self, audio: np.ndarray) -> np.ndarray:
+        """Returns the part of audio to insert into the processor"""
+        audio = np.concatenate((self._remainder, audio))
+        n_frames = len(audio) // self.frame
+        self._remainder = audio[n_frames * self.frame:]
+        if not n_frames:
+            return np.zeros(0, dtype=np.float32)
+        frames = audio[:n_frames * self.frame].reshape(n_frames, self.frame)
+
+        out = []
+        for frame, level in zip(frames, self.frame_levels(frames)):
+            if level > max(self.threshold_db, self.noise_floor_db + self.margin_db):
+                out.extend(self._preroll)
+                self._preroll.clear()
+                out.append(frame)
+                self._silence_run = 0
+                # this iteration and one more, that lets HypothesisBuffer confirm the tail of the phrase
+                self._pending_iterations = 2
+                # slow upward drift, so a constant loud background is eventually taken as noise
+                self.noise_floor_db += 0.002 * (level - self.noise_floor_db)
+            else:
+                self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * level
+                self._silence_run += self.frame
+                if self._silence_run <= self.keep_samples:
+                    out.append(frame)
+                else:
+                    if len(self._preroll) == self._preroll.maxlen:
+                        self.dropped_sec += self.frame / self.sampling_rate
+                        self._note_drop(self._emitted + len(out) * self.frame)
+                    self._preroll.append(frame)
+        self.silence_sec = self._silence_run / self.sampling_rate
+        self._emitted += len(out) * self.frame
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+    def _note_drop(self, position):
+        dropped = (self._gaps_dropped[-1] if self._gaps_dropped else 0) + self.frame
+        if self._gaps_at and self._gaps_at[-1] == position:
+            self._gaps_dropped[-1] = dropped
+        else:
+            self._gaps_at.append(position)
+            self._gaps_dropped.append(dropped)
+
+    def dropped_before(self, output_sec):
+        """Seconds of captured audio dropped before output_sec of the gate output (processor time)"""
+        i = bisect_right(self._gaps_at, output_sec * self.sampling_rate)
+        return self._gaps_dropped[i - 1] / self.sampling_rate if i else 0.0
+
+    def take_speech(self) -> bool:
+        """True if new speech arrived since the previous call (and once after it ended)"""
+        if self._pending_iterations:
+            self._pending_iterations -= 1
+            return True
+        return False
@@ -1,50 +1,152 @@
-from dataclasses import asdict
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import numpy as np
-from .types import Word
+from .FeatureCache import CachedFeatureExtractor
+from .types import Word, spread_times
+
+STOP_PHRASES_DIR = Path(__file__).parent / 'stop_phrases'
+# words of a segment text the way faster-whisper emits them: with the space before the word
+WORD_RE = re.compile(r'\s*\S+')
+# compute types CTranslate2 has only on CUDA
+GPU_COMPUTE_TYPES = {'float16', 'int8_float16', 'bfloat16', 'int8_bfloat16'}
+
+
+def model_config(settings, **overrides):
+    """FasterWhisperASR arguments from the model_* settings, every streaming entry point loads the model with them"""
+    return dict(modelsize=settings.model_size,
+                lan=settings.model_language,
+                vad=settings.model_vad,
+                device=settings.model_device,
+                compute_type=settings.model_compute_type,
+                cpu_threads=settings.model_cpu_threads,
+                num_workers=settings.model_num_workers,
+                beam_size=settings.model_beam_size,
+                feature_cache=settings.model_feature_cache,
+                word_timestamps=settings.model_word_timestamps) | overrides
+
+
+def load_stop_phrases(language=None):
+    """Hallucination phrases from stop_phrases/<language>.txt, all languages when the language is autodetected"""
+    files = [STOP_PHRASES_DIR / f'{language}.txt'] if language else sorted(STOP_PHRASES_DIR.glob('*.txt'))
+    phrases = set()
+    for file in files:
+        if file.exists():
+            with open(file, encoding='utf8') as f:
+                phrases.update(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return phrases
 
 
 class FasterWhisperASR:
+    metrics_writer = None
     sep = ""  # join transcribe words with this character "" for faster-whisper because it emits the spaces when neeeded)
 
-    STOP_PHRASES = {
-        'Субтитры сделал DimaTorzok',
-        'Субтитры создавал DimaTorzok',
-        'Продолжение следует...',
-        'Редактор субтитров А.Семкин Корректор А.Егорова',
-        'Спасибо за внимание.',
-        'Продолжение',
-        'Продолжение серии.',
-        'следует...',
-        'Спасибо за внимание!',
-        'Субтитры подогнал «Симон»!',
-        'Корректор А.Кулакова.',
-        'До новых встреч.',
-        'Субтитры подогнал «Симон»',
-        'ПОДПИШИСЬ НА КАНАЛ, ЧТОБЫ НЕ ПРОПУСТИТЬ НОЛИКИ.',
-        'Смотритев следующей части.',
-        'Смотритев следующей серии.',
-        ' сделал DimaTorzok',
-        "И, конечно же, я надеюсь, что вам понравилось это видео. Если вам понравилось это видео, пожалуйста, ставьте лайки и подписывайтесь на мой канал. До новых встреч!",
-        "Добро пожаловать на наш канал!"
-    }
-
-    def __init__(self, lan=None, modelsize='large-v3', vad=True):
+    STOP_PHRASES = set()
+
+    def __init__(self, lan=None, modelsize='large-v3', vad=True, device='auto', compute_type='auto',
+                 cpu_threads=0, num_workers=1, beam_size=5, feature_cache=True, word_timestamps=True):
         from faster_whisper import WhisperModel
         self.transcribe_kargs = {"vad_filter": vad}
         self.original_language = lan
-        self.model = WhisperModel(modelsize, device="cuda", compute_type="float16")
+        self.STOP_PHRASES = load_stop_phrases(lan)
+        self.beam_size = beam_size
+        # False: decode without the word alignment pass, word times are spread over the segment,
+        # only the segment around the commit point (align_from) is aligned
+        self.word_timestamps = word_timestamps
+        self.aligned_segments = 0
+        self.device, self.compute_type = self.resolve_device(device, compute_type)
+        self.model = WhisperModel(modelsize, device=self.device, compute_type=self.compute_type,
+                                  cpu_threads=cpu_threads, num_workers=num_workers)
+        # log-mel frames of the audio that stays in the streaming buffer are computed once, not every iteration
+        self.feature_cache = None
+        if feature_cache:
+            self.feature_cache = self.model.feature_extractor = CachedFeatureExtractor(self.model.feature_extractor)
+        # CTranslate2 runs up to num_workers requests of the same model in parallel from different threads
+        self.batch_pool = ThreadPoolExecutor(num_workers)
         # warm up the ASR, because the very first transcribe takes much more time than the other
-        self.transcribe(np.zeros(16000, dtype=np.float32))
+        warmup_sec = 1
+        t = time.time()
+        self.transcribe(np.zeros(16000 * warmup_sec, dtype=np.float32))
+        self.warmup_rtf = (time.time() - t) / warmup_sec
+        print(f"ASR {modelsize} on {self.device}/{self.compute_type}, cpu_threads={cpu_threads}, "
+              f"num_workers={num_workers}, beam_size={beam_size}, warm-up RTF {self.warmup_rtf:.2f}")
+
+    @staticmethod
+    def resolve_device(device='auto', compute_type='auto'):
+        """Falls back to CPU int8 when CUDA is requested (or auto) but not available,
+        a GPU-only compute type never goes to the CPU: CTranslate2 rejects it there"""
+        import ctranslate2
+        if device in ('auto', 'cuda') and ctranslate2.get_cuda_device_count() == 0:
+            if device == 'cuda' or compute_type in GPU_COMPUTE_TYPES:
+                print("CUDA is not available, falling back to CPU int8")
+                compute_type = 'int8'
+            device = 'cpu'
+        elif device == 'auto':
+            device = 'cuda'
+        if compute_type == 'auto':
+            compute_type = 'float16' if device == 'cuda' else 'int8'
+        elif device == 'cpu' and compute_type in GPU_COMPUTE_TYPES:
+            print(f"{compute_type} needs CUDA, using int8 on CPU")
+            compute_type = 'int8'
+        return device, compute_type
+
+    def count_tokens(self, text):
+        return len(self.model.hf_tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def transcribe_batch(self, audios, prompts=None, align_from=None, options=None):
+        """Several buffers at once, each with its own prompt, returns a (words, ends) per buffer"""
+        prompts = prompts or [""] * len(audios)
+        align_from = align_from or [None] * len(audios)
+        options = options or [None] * len(audios)
+        return list(self.batch_pool.map(self.transcribe, audios, prompts, align_from, options))
+
+    def segment_words(self, audio, segment, language, align):
+        """Words of a segment decoded without word timestamps, aligned when it holds the commit point"""
+        if align:
+            try:
+                return self.align_segment(audio, segment, language)
+            except Exception as e:
+                print(f"word alignment failed, times are interpolated: {e!r}")
+        probability = math.exp(segment.avg_logprob)
+        words = [Word(0.0, 0.0, text, probability) for text in WORD_RE.findall(segment.text)]
+        return spread_times(words, segment.start, segment.end)
+
+    def align_segment(self, audio, segment, language):
+        """Word timestamps for one segment: an encoder pass over its audio and the cross-attention alignment
+        of the tokens already decoded, the same alignment word_timestamps=True runs for every segment"""
+        from faster_whisper.tokenizer import Tokenizer
+        # the plain extractor: the clip must not take a slot of the streaming feature cache
+        extractor = getattr(self.model.feature_extractor, 'extractor', self.model.feature_extractor)
+        rate = extractor.sampling_rate
+        clip = audio[int(segment.start * rate):int(segment.end * rate)]
+        features = extractor(clip)[:, :extractor.nb_max_frames]
+        num_frames = min(len(clip) // extractor.hop_length, extractor.nb_max_frames)
+        features = np.pad(features, ((0, 0), (0, extractor.nb_max_frames - features.shape[-1])))
+        encoder_output = self.model.encode(features)
+        tokenizer = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                              task="transcribe", language=language)
+        tokens = [t for t in segment.tokens if t < tokenizer.eot]
+        alignment = self.model.find_alignment(tokenizer, [tokens], encoder_output, num_frames)[0]
+        self.aligned_segments += 1
+        return [Word(segment.start + w['start'], segment.start + w['end'], w['word'], w['probability'])
+                for w in alignment if w['word']]
 
-    def transcribe(self, audio, init_prompt=""):
+    def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+        """align_from: the commit point in buffer seconds, only used without word timestamps.
+        options: WhisperModel.transcribe arguments over the defaults, e.g. temperature, beam_size, clip_timestamps
+        for a region decoded again after a rejected hallucination"""
+        t = time.perf_counter()
+        # note: faster-whisper decodes its VAD speech chunks instead of clip_timestamps when vad_filter is on
+        decoding = {"beam_size": self.beam_size, **self.transcribe_kargs, **(options or {})}
         segments, info = self.model.transcribe(audio,
                                                language=self.original_language,
                                                initial_prompt=init_prompt,
-                                               beam_size=5,
-                                               word_timestamps=True,
+                                               word_timestamps=self.word_timestamps,
                                                condition_on_previous_text=True,
-                                               **self.transcribe_kargs
+                                               **decoding
                                                )
         # return list(segments)
         words, ends = [], []
@@ -53,7 +155,17 @@ class FasterWhisperASR:
             #     continue
             # Не работает, надо удалять фразы из объединённого текста,
             # т.к. в сегменты попадают и отдельные слова и лишние слова
-            for word in segment.words:
-                words.append(Word(**asdict(word)))
+            if self.word_timestamps:
+                for word in segment.words:
+                    words.append(Word(word.start, word.end, word.word, word.probability))
+            else:
+                # segment edges are exact anyway, a commit point at an edge needs no alignment
+                align = align_from is not None and segment.start + 0.05 < align_from < segment.end - 0.05
+                words.extend(self.segment_words(audio, segment, info.language, align))
             ends.append(segment.end)
+        if self.metrics_writer is not None:
+            self.metrics_writer.write("transcribe", audio_sec=round(len(audio) / 16000, 3),
+                                      wall_sec=round(time.perf_counter() - t, 4),
+                                      segments=len(ends), words=len(words),
+                                      features=self.feature_cache.stats() if self.feature_cache else None)
         return words, ends
@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+
+
+class CachedFeatureExtractor:
+    """
+    Drop-in replacement for faster-whisper's FeatureExtractor that reuses the log-mel frames of audio
+    transcribed in a previous call. Streaming buffers overlap: the next buffer is the previous one, trimmed
+    at the front by a whole number of hops (ASRProcessor trims on the frame grid), plus new audio at the end.
+
+    Each stream keeps its last buffer and its raw (not yet normalized) log-mel frames, the frames are keyed by
+    their absolute position in the stream, learnt by aligning the new buffer against the cached one, so several
+    streams sharing one model (server sessions, batches) have their own entries. A frame is reused when its
+    whole STFT window lies inside both buffers, only the first two frames and the new tail are recomputed.
+    The normalization (clamp to max - 8, scale) depends on the whole buffer and is applied every time.
+    Frames in front of a trim are dropped as soon as the trimmed buffer comes, idle streams fall out by LRU.
+
+    The alignment does not scan the buffer: a few loud samples of the last min_overlap of the cached buffer
+    (always inside the overlap) are a fingerprint, all trims on the hop grid are checked against it at once,
+    and only the few survivors are compared in full. Long runs of equal samples (zeros after the voice gate,
+    pre-roll silence) no longer make every position a candidate; when they fill the fingerprint too,
+    at most max_candidates shifts are tried and the frames are recomputed otherwise.
+    """
+    anchors = 16
+    max_candidates = 4
+
+    def __init__(self, extractor, max_streams=8, min_overlap_sec=1.0):
+        self.extractor = extractor
+        self.n_fft = extractor.n_fft
+        self.hop = extractor.hop_length
+        self.window = np.hanning(self.n_fft + 1)[:-1].astype(np.float32)
+        self.mel_filters = np.asarray(extractor.mel_filters, dtype=np.float32)
+        self.max_streams = max_streams
+        self.min_overlap = int(min_overlap_sec * extractor.sampling_rate)
+        self._entries = []  # [(audio, raw frames, fingerprint positions)], the most recently used last
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.frames_reused = 0
+        self.frames_computed = 0
+
+    def __getattr__(self, name):
+        # nb_max_frames, time_per_frame, sampling_rate... are read by WhisperModel.transcribe
+        return getattr(self.extractor, name)
+
+    def _frames(self, padded, first, last):
+        """Raw log-mel of frames [first, last) of the centered STFT of padded audio"""
+        if last <= first:
+            return np.empty((len(self.mel_filters), 0), dtype=np.float32)
+        half = self.n_fft // 2
+        # only the samples these frames need, reflected at the ends like a centered STFT does
+        begin, end = first * self.hop - half, (last - 1) * self.hop + half
+        lo, hi = max(begin, 0), min(end, len(padded))
+        segment = padded[lo:hi]
+        if lo - begin or end - hi:
+            segment = np.pad(segment, (lo - begin, end - hi), mode='reflect')
+        windows = np.lib.stride_tricks.sliding_window_view(segment, self.n_fft)[::self.hop] * self.window
+        power = np.abs(np.fft.rfft(windows, axis=-1)).astype(np.float32) ** 2
+        mel = self.mel_filters @ power.T
+        self.frames_computed += last - first
+        return np.log10(np.maximum(mel, 1e-10))
+
+    def _fingerprint(self, audio):
+        """Positions of the loudest samples among the last min_overlap, every alignment includes them"""
+        last_start = len(audio) - self.min_overlap
+        if last_start < 0:
+            return None
+        tail = np.abs(audio[last_start:])
+        k = min(self.anchors, len(tail))
+        return last_start + np.argpartition(tail, len(tail) - k)[len(tail) - k:]
+
+    def _align(self, audio):
+        """Finds a cached buffer whose end is the beginning of audio: (entry index, trimmed samples) or None"""
+        if len(audio) < self.min_overlap:
+            return None
+        for index in range(len(self._entries) - 1, -1, -1):
+            cached, _, anchors = self._entries[index]
+            if anchors is None:
+                continue
+            # the trim is a whole number of hops, at most len - min_overlap, and audio holds all of the rest
+            first = -(-max(len(cached) - len(audio), 0) // self.hop) * self.hop
+            shifts = np.arange(first, len(cached) - self.min_overlap + 1, self.hop)
+            matches = (audio[anchors[:, None] - shifts[None, :]] == cached[anchors][:, None]).all(axis=0)
+            for shift in shifts[matches][:self.max_candidates]:
+                if np.array_equal(cached[shift:], audio[:len(cached) - shift]):
+                    return index, int(shift)
+        return None
+
+    def __call__(self, waveform, padding=160, chunk_length=None, to_cpu=False):
+        if chunk_length is not None:
+            self.extractor.n_samples = chunk_length * self.extractor.sampling_rate
+            self.extractor.nb_max_frames = self.extractor.n_samples // self.hop
+        audio = np.asarray(waveform, dtype=np.float32)
+        pad = self.extractor.n_samples if padding is True else int(padding or 0)
+        padded = np.pad(audio, (0, pad)) if pad else audio
+        n_frames = len(padded) // self.hop
+        half = self.n_fft // 2
+
+        with self._lock:
+            self.calls += 1
+            found = self._align(audio)
+            entry = self._entries.pop(found[0]) if found else None
+
+        # frames that can be taken over: their window lies within the real samples of both buffers
+        reuse_from = reuse_to = (half + self.hop - 1) // self.hop
+        if entry is not None:
+            cached, raw, _ = entry
+            shift_frames = found[1] // self.hop
+            reuse_to = max(reuse_from, min((len(cached) - half) // self.hop - shift_frames + 1, n_frames))
+        parts = [self._frames(padded, 0, min(reuse_from, n_frames))]
+        if entry is not None and reuse_to > reuse_from:
+            parts.append(raw[:, reuse_from + shift_frames:reuse_to + shift_frames])
+            self.frames_reused += reuse_to - reuse_from
+        # past the real samples a long zero padding gives frames of silence, they need no FFT
+        silent_from = n_frames
+        if pad > half:
+            silent_from = max(min((len(audio) + half + self.hop - 1) // self.hop, n_frames), reuse_to)
+        parts.append(self._frames(padded, max(reuse_to, min(reuse_from, n_frames)), silent_from))
+        parts.append(np.full((len(self.mel_filters), n_frames - silent_from), -10.0, dtype=np.float32))
+        raw = np.concatenate(parts, axis=1)
+
+        fingerprint = self._fingerprint(audio)
+        with self._lock:
+            self._entries.append((audio.copy(), raw, fingerprint))
+            del self._entries[:-self.max_streams]
+
+        log_spec = np.maximum(raw, raw.max() - 8.0)
+        return (log_spec + 4.0) / 4.0
+
+    def stats(self):
+        total = self.frames_reused + self.frames_computed
+        return {
+            "calls": self.calls,
+            "frames_reused": self.frames_reused,
+            "frames_computed": self.frames_computed,
+            "hit_rate": round(self.frames_reused / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,247 @@
+import importlib
+import multiprocessing
+import signal
+import threading
+import time
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .types import Word
+
+DEFAULT_TARGET = 'app.models.FasterWhisper:FasterWhisperASR'
+# words of a result are sent as one string, a word never holds a NUL
+WORD_SEP = '\x00'
+
+
+class WorkerError(Exception):
+    pass
+
+
+class LastMetrics:
+    """Stands in for MetricsWriter in the worker: keeps the fields of the last event, they go back with the result"""
+    fields = None
+
+    def write(self, event, **fields):
+        self.fields = fields
+
+
+def load_target(target: str):
+    module, _, name = target.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def pack_result(asr, words: list[Word], ends, metrics):
+    """A transcription as a few flat buffers instead of a list of objects: cheap to pickle and to unpack"""
+    times = np.array([(w.start, w.end, w.probability) for w in words], dtype=np.float32).reshape(-1, 3)
+    # token counts ride along, the parent needs them for the prompt window and has no tokenizer
+    tokens = np.array([asr.count_tokens(w.word) for w in words], dtype=np.int32)
+    return (times.tobytes(), tokens.tobytes(), WORD_SEP.join(w.word for w in words),
+            np.asarray(ends, dtype=np.float32).tobytes(), metrics)
+
+
+def unpack_result(payload):
+    times, tokens, text, ends, metrics = payload
+    times = np.frombuffer(times, dtype=np.float32).reshape(-1, 3).tolist()
+    texts = text.split(WORD_SEP) if times else []
+    words = [Word(start, end, word, probability) for (start, end, probability), word in zip(times, texts)]
+    return words, np.frombuffer(ends, dtype=np.float32).tolist(), np.frombuffer(tokens, dtype=np.int32), metrics
+
+
+def serve(conn, target, config):
+    """Worker process: loads the model, then transcribes the audio the parent puts in shared memory"""
+    # Ctrl+C reaches the whole process group, the parent decides when the worker ends
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asr = load_target(target)(**config)
+    except Exception as e:
+        conn.send(('error', f"model load failed: {e!r}"))
+        return
+    asr.metrics_writer = collected = LastMetrics()
+    conn.send(('ready', {"sep": asr.sep, "STOP_PHRASES": asr.STOP_PHRASES,
+                         "word_timestamps": getattr(asr, 'word_timestamps', True)}))
+    shm = None
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request[0] == 'close':
+            break
+        _, name, n_samples, prompt, align_from, options = request
+        if shm is None or shm.name != name:
+            if shm is not None:
+                shm.close()
+            shm = SharedMemory(name)
+        audio = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf)
+        try:
+            collected.fields = None
+            t = time.perf_counter()
+            words, ends = asr.transcribe(audio, init_prompt=prompt, align_from=align_from, options=options)
+            metrics = collected.fields or {"wall_sec": round(time.perf_counter() - t, 4)}
+            conn.send(('ok', pack_result(asr, words, ends, metrics)))
+        except Exception as e:
+            conn.send(('error', repr(e)))
+        finally:
+            # the view must go before the segment can be closed
+            del audio
+    if shm is not None:
+        shm.close()
+
+
+def shutdown(process, conn, shm, graceful=True):
+    if graceful:
+        try:
+            conn.send(('close',))
+        except (OSError, ValueError):
+            pass
+        process.join(2)
+    if process.is_alive():
+        process.kill()
+    conn.close()
+    if shm is not None:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass  # already unlinked by close() or by another finalizer
+
+
+class ProcessASR:
+    """
+    FasterWhisperASR (or any ASR given as 'module:Class') hosted in a child process, with the same transcribe()
+    interface. The model's CPU work (features, tokenizer, Word objects) then does not take the GIL from
+    the capture callback, the hotkeys and Tk, and a CUDA error or a crash kills only the worker.
+
+    The audio is written to shared memory, only the request parameters go through the pipe, the result comes back
+    as flat arrays plus one string of words. A worker that crashes, reports an error or does not answer within
+    timeout_sec is killed and started again with the model reloaded, the request is repeated. All streaming state
+    lives in ASRProcessor in this process, so nothing is lost: at worst one iteration returns no words and the
+    same audio is transcribed on the next one.
+    """
+    metrics_writer = None
+
+    def __init__(self, timeout_sec=120.0, load_timeout_sec=None, max_retries=1, target=DEFAULT_TARGET, **config):
+        self.target = target
+        self.config = config
+        self.timeout_sec = timeout_sec
+        self.load_timeout_sec = load_timeout_sec  # None - wait for the model as long as it takes (downloads)
+        self.max_retries = max_retries
+        self._context = multiprocessing.get_context('spawn')  # CUDA does not survive a fork
+        self._lock = threading.Lock()
+        self._process = self._conn = self._shm = self._finalizer = None
+        self._tokens = {}
+        self.restarts = 0
+        self.last_error = None
+        self.start()
+
+    def start(self):
+        # a worker that died between requests still has its finalizer and pipe, they go before the new ones
+        self.stop(graceful=False)
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=serve, args=(child_conn, self.target, self.config),
+                                        name='asr worker', daemon=True)
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, conn
+        self._finalizer = weakref.finalize(self, shutdown, process, conn, self._shm)
+        try:
+            if not conn.poll(self.load_timeout_sec):
+                raise WorkerError("model load timed out")
+            kind, info = conn.recv()
+        except (EOFError, OSError):
+            process.join(1)
+            kind, info = 'error', f"exited with code {process.exitcode} while loading"
+        except WorkerError as e:
+            kind, info = 'error', str(e)
+        if kind != 'ready':
+            self.stop(graceful=False)
+            raise WorkerError(info)
+        self.sep = info["sep"]
+        self.STOP_PHRASES = info["STOP_PHRASES"]
+        self.word_timestamps = info["word_timestamps"]
+
+    def stop(self, graceful=True):
+        """Ends the worker, the shared memory stays for the next one"""
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        if self._process is not None:
+            shutdown(self._process, self._conn, None, graceful)
+        self._process = self._conn = self._finalizer = None
+
+    def close(self):
+        self.stop()
+        if self._shm is not None:
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = None
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def count_tokens(self, text):
+        # prompt words are commited words, their counts came with a result; a rough BPE estimate otherwise
+        return self._tokens.get(text) or max(len(text) // 3, 1)
+
+    def _share(self, audio):
+        if self._shm is None or self._shm.size < audio.nbytes:
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+            # room to grow: the streaming buffer gets longer every iteration until it is trimmed
+            self._shm = SharedMemory(create=True, size=max(2 * audio.nbytes, 2 ** 20))
+            if self._finalizer is not None:
+                self._finalizer.detach()
+                self._finalizer = weakref.finalize(self, shutdown, self._process, self._conn, self._shm)
+        np.ndarray(audio.shape, dtype=np.float32, buffer=self._shm.buf)[:] = audio
+        return self._shm.name
+
+    def _request(self, audio, prompt, align_from, options):
+        name = self._share(audio)
+        try:
+            self._conn.send(('transcribe', name, len(audio), prompt, align_from, options))
+            if not self._conn.poll(self.timeout_sec):
+                raise WorkerError(f"no answer in {self.timeout_sec} s")
+            kind, payload = self._conn.recv()
+        except (EOFError, OSError):
+            self._process.join(1)
+            raise WorkerError(f"exited with code {self._process.exitcode}")
+        if kind != 'ok':
+            raise WorkerError(payload)
+        return unpack_result(payload)
+
+    def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        with self._lock:
+            for attempt in range(self.max_retries + 1):
+                t = time.perf_counter()
+                try:
+                    if not self.alive:
+                        if self._process is not None:
+                            # died between requests, nothing recorded why
+                            self._process.join(1)
+                            self.last_error = f"exited with code {self._process.exitcode}"
+                        self.restarts += 1
+                        print(f"ASR worker restart #{self.restarts}: {self.last_error}")
+                        self.start()
+                    words, ends, tokens, metrics = self._request(audio, init_prompt, align_from, options)
+                except WorkerError as e:
+                    self.last_error = str(e)
+                    # a worker that failed is not trusted to exit by itself
+                    self.stop(graceful=False)
+                    continue
+                if len(self._tokens) > 100_000:
+                    self._tokens.clear()
+                self._tokens.update(zip((w.word for w in words), tokens.tolist()))
+                if self.metrics_writer is not None:
+                    wall_sec = time.perf_counter() - t
+                    self.metrics_writer.write("transcribe", **metrics, worker_sec=round(wall_sec, 4),
+                                              restarts=self.restarts)
+                return words, ends
+        print(f"ASR worker failed {self.max_retries + 1} times, iteration skipped: {self.last_error}")
+        return [], []
@@ -0,0 +1,114 @@
+import json
+from bisect import bisect_left
+
+from .types import Word, spread_times
+
+
+class ScriptedASR:
+    """
+    Deterministic stand-in for FasterWhisperASR that returns pre-recorded words instead of running a model.
+    The script is a timeline of words in absolute session time (the "words" list of transcribe_files.py JSON output).
+    On every call it returns the words heard inside the current buffer, relative to the buffer start,
+    the last word still being spoken at the buffer end comes truncated, like a real model would hear it.
+    Needs the processor to know the buffer position: set `asr.processor = processor`.
+    `hallucinations` are extra words (not part of the script) that the default decoding emits as well,
+    a decode with other options (a retry after a rejection) does not.
+    """
+    sep = ""
+    STOP_PHRASES = set()
+
+    def __init__(self, words: list[Word], sampling_rate=16000, decode_cost=(0.05, 0.02), align_cost=(0.03, 0.004),
+                 word_timestamps=True, hallucinations=()):
+        self.words = words
+        self._starts = [w.start for w in words]
+        self.hallucinations = list(hallucinations)
+        self.timeline = sorted(self.words + self.hallucinations, key=lambda w: w.start)
+        self._timeline_starts = [w.start for w in self.timeline]
+        self.sampling_rate = sampling_rate
+        # simulated decode time = base + per audio second, used by the benchmark clock
+        self.decode_cost = decode_cost
+        # word alignment: (separate encoder pass, per aligned audio second), the first part is only paid
+        # when alignment runs on its own for one segment, like FasterWhisperASR without word timestamps
+        self.align_cost = align_cost
+        # False: like FasterWhisperASR(word_timestamps=False), times are spread over segments
+        # except the segment holding align_from
+        self.word_timestamps = word_timestamps
+        self.processor = None
+        self.last_decode_sec = 0.0
+
+    @classmethod
+    def from_json(cls, path, **kwargs):
+        with open(path, encoding='utf8') as f:
+            data = json.load(f)
+        words = [Word(w['start'], w['end'], w['word'], w.get('probability', 1.0)) for w in data['words']]
+        return cls(words, **kwargs)
+
+    @classmethod
+    def synthetic(cls, text, words_per_sec=2.5, pause_every=12, pause_sec=0.7, hallucinate_every=0, **kwargs):
+        """hallucinate_every: every that many pauses the decoder "loops": the last two words come again
+        three times within the pause, with a low probability"""
+        words, hallucinations, t = [], [], 0.0
+        step = 1 / words_per_sec
+        for i, word in enumerate(text.split()):
+            if i and i % pause_every == 0:
+                if hallucinate_every and (i // pause_every) % hallucinate_every == 0:
+                    loop = [w.word for w in words[-2:]] * 3
+                    length = pause_sec * 0.8 / len(loop)
+                    hallucinations.extend(Word(t + k * length, t + (k + 1) * length, w, 0.15)
+                                          for k, w in enumerate(loop))
+                t += pause_sec
+            words.append(Word(t, t + step * 0.85, " " + word, 0.9))
+            t += step
+        return cls(words, hallucinations=hallucinations, **kwargs)
+
+    @property
+    def duration(self):
+        return self.words[-1].end + 0.5 if self.words else 0.0
+
+    def count_tokens(self, text):
+        # rough BPE estimate, good enough for the prompt window
+        return max(len(text) // 3, 1)
+
+    def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+        offset = self.processor.buffer_time_offset if self.processor is not None else 0.0
+        buffer_sec = len(audio) / self.sampling_rate
+        buffer_end = offset + buffer_sec
+        # a retry decodes only from its clip start on
+        clip_from = offset + (options or {}).get("clip_timestamps", [0.0])[0]
+        decoded_sec = buffer_end - clip_from
+        self.last_decode_sec = self.decode_cost[0] + self.decode_cost[1] * decoded_sec
+        if self.word_timestamps:
+            self.last_decode_sec += self.align_cost[1] * decoded_sec
+
+        timeline, starts = (self.words, self._starts) if options else (self.timeline, self._timeline_starts)
+        words, ends = [], []
+        for w in timeline[bisect_left(starts, max(offset, clip_from) - 0.05):]:
+            if w.start >= buffer_end:
+                break
+            word = w.word
+            if w.end > buffer_end:
+                heard = (buffer_end - w.start) / (w.end - w.start)
+                word = word[:max(int(len(word) * heard), 1)]
+            words.append(Word(w.start - offset, min(w.end, buffer_end) - offset, word, w.probability))
+            if word.rstrip().endswith(('.', '!', '?')) or w.end > buffer_end:
+                ends.append(words[-1].end)
+        if words and (not ends or ends[-1] != words[-1].end):
+            ends.append(words[-1].end)
+        if not self.word_timestamps:
+            self.spread_segments(words, ends, align_from)
+        return words, ends
+
+    def spread_segments(self, words, ends, align_from):
+        first = 0
+        for end in ends:
+            last = first
+            while last < len(words) and words[last].end <= end:
+                last += 1
+            segment = words[first:last]
+            if segment:
+                start = segment[0].start
+                if align_from is not None and start + 0.05 < align_from < end - 0.05:
+                    self.last_decode_sec += self.align_cost[0] + self.align_cost[1] * (end - start)
+                else:
+                    spread_times(segment, start, end)
+            first = last
@@ -1,16 +1,93 @@
-from typing import NamedTuple
-
+import sys
 from dataclasses import dataclass
 
+import numpy as np
+
 
-@dataclass
+@dataclass(slots=True)
 class Word:
     start: float
     end: float
     word: str
     probability: float
 
+    def __post_init__(self):
+        # the same words repeat all session long, keep one copy of each string
+        self.word = sys.intern(self.word)
+
     def add_offset(self, offset: float | int):
         self.start += offset
         self.end += offset
-        return self
\ No newline at end of file
+        return self
+
+
+def spread_times(words: list[Word], start: float, end: float) -> list[Word]:
+    """For text decoded without word timestamps: the segment time is shared between its words by their length"""
+    total = sum(len(w.word) for w in words) or 1
+    position = 0
+    for w in words:
+        w.start = start + (end - start) * position / total
+        position += len(w.word)
+        w.end = start + (end - start) * position / total
+    return words
+
+
+class WordArray:
+    """
+    Append-only struct-of-arrays storage of words: timings and probabilities in NumPy arrays
+    with geometric growth, interned word strings in a list. Word objects are created only on access.
+    """
+
+    def __init__(self, capacity=1024):
+        self._start = np.zeros(capacity)
+        self._end = np.zeros(capacity)
+        self._probability = np.zeros(capacity, dtype=np.float32)
+        self.words: list[str] = []
+
+    def __len__(self):
+        return len(self.words)
+
+    def __bool__(self):
+        return bool(self.words)
+
+    def _grow(self, n):
+        if n <= len(self._end):
+            return
+        size = max(n, 2 * len(self._end))
+        for name in ('_start', '_end', '_probability'):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(self)] = old[:len(self)]
+            setattr(self, name, new)
+
+    def append(self, word: Word):
+        i = len(self.words)
+        self._grow(i + 1)
+        self._start[i] = word.start
+        self._end[i] = word.end
+        self._probability[i] = word.probability
+        self.words.append(sys.intern(word.word))
+
+    def extend(self, words):
+        for word in words:
+            self.append(word)
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self._end[:len(self)]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return Word(float(self._start[item]), float(self._end[item]), self.words[item],
+                    float(self._probability[item]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def text(self, begin=0, end=None, sep=""):
+        return sep.join(self.words[begin:end])
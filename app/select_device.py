@@ -1,7 +1,9 @@
-import pyaudio
+import json
+from pathlib import Path
 
 
-def select_input_devices():
+def list_input_devices():
+    import pyaudio
     p = pyaudio.PyAudio()
     input_devices = {}
     for i in range(p.get_device_count()):
@@ -14,9 +16,37 @@ def select_input_devices():
             if name not in input_devices.values():
                 input_devices[i] = name
     p.terminate()
+    return input_devices
+
+
+LOOPBACK_NAMES = ('monitor', 'loopback', 'stereo mix', 'what u hear', 'стерео микшер')
+
+
+def find_loopback_devices():
+    """Inputs that capture the playback: PulseAudio/PipeWire monitors, ALSA snd-aloop, Windows Stereo Mix"""
+    return {index: name for index, name in list_input_devices().items()
+            if any(key in name.lower() for key in LOOPBACK_NAMES)}
+
+
+def select_input_devices(remember_file=None):
+    """
+    Asks for the microphone. With remember_file the choice is saved there and reused on the next start
+    while a device with the same index and name exists, so the prompt is skipped.
+    """
+    input_devices = list_input_devices()
+    remembered = {}
+    if remember_file and Path(remember_file).exists():
+        remembered = json.loads(Path(remember_file).read_text(encoding='utf8'))
+        index = remembered.get('device_index')
+        if index is not None and input_devices.get(index) == remembered.get('device_name'):
+            print(f"Microphone {index}: {input_devices[index]} (remembered in {remember_file})")
+            return index
 
     for index, name in input_devices.items():
         print(f"{index:>2}: {name.replace('Microphone ', '')}")
 
     index = int(input("Enter index or none: ") or 0)
+    if remember_file and index in input_devices:
+        remembered.update(device_index=index, device_name=input_devices[index])
+        Path(remember_file).write_text(json.dumps(remembered, ensure_ascii=False, indent=1), encoding='utf8')
     return index
@@ -0,0 +1,41 @@
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Durations of the startup phases, phases may run in different threads"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        t = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.time() - t
+
+    def mark(self, name):
+        """Time since the start of the program"""
+        self.phases[name] = time.time() - self.started
+
+    def report(self):
+        return ", ".join(f"{name} {sec:.2f}s" for name, sec in self.phases.items())
+
+
+def load_in_background(factory, name='model') -> Future:
+    """Runs factory() in a daemon thread, the result (or the error) is delivered through the future"""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(factory())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"load {name}", daemon=True).start()
+    return future
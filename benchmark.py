@@ -0,0 +1,80 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from app.AdaptiveScheduler import AdaptiveScheduler
+from app.HallucinationDetector import build_detector
+from app.StreamingBenchmark import StreamingBenchmark, load_wav, synthetic_audio
+from app.models.ScriptedASR import ScriptedASR
+from settings import Settings
+
+SAMPLE_TEXT = ("Распознавание речи на лету требует аккуратной работы с буфером. Каждое новое слово сравнивается "
+               "с предыдущей гипотезой и выводится, только когда две итерации согласны. ") * 20
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Reproducible streaming benchmark of ASRProcessor")
+    parser.add_argument('--audio', help="WAV (or any librosa-readable) file, synthetic noise by default")
+    parser.add_argument('--script', help="JSON with pre-recorded words (transcribe_files.py -f json output)")
+    parser.add_argument('--model', action='store_true', help="use the real FasterWhisperASR instead of the stub")
+    parser.add_argument('--min-chunk', type=float, default=settings.min_chunk_sec)
+    parser.add_argument('--decode-cost', type=float, nargs=2, default=(0.05, 0.02),
+                        metavar=('BASE', 'PER_SEC'), help="simulated stub decode time: base + per audio second")
+    parser.add_argument('--no-word-timestamps', action='store_true',
+                        help="decode without word alignment, align only the segment at the commit point")
+    parser.add_argument('--adaptive', action='store_true', help="adaptive chunk size and trimming (AdaptiveScheduler)")
+    parser.add_argument('--speculative', action='store_true',
+                        help="type the unconfirmed hypothesis too, measure visible delay and corrections")
+    parser.add_argument('--hallucinate', type=int, default=0, metavar='N',
+                        help="the synthetic stub loops on the last words in every N-th pause")
+    parser.add_argument('--detector', action='store_true',
+                        help="reject hallucinations before commit (hallucination_* in settings.py), retries are timed")
+    parser.add_argument('--per-iteration', action='store_true', help="include the per-iteration log")
+    parser.add_argument('-o', '--output', help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.model:
+        from app.models.FasterWhisper import FasterWhisperASR, model_config
+        asr = FasterWhisperASR(**model_config(settings))
+    elif args.script:
+        asr = ScriptedASR.from_json(args.script, sampling_rate=settings.sample_rate, decode_cost=args.decode_cost)
+    else:
+        asr = ScriptedASR.synthetic(SAMPLE_TEXT, sampling_rate=settings.sample_rate, decode_cost=args.decode_cost,
+                                    hallucinate_every=args.hallucinate)
+
+    if args.no_word_timestamps:
+        asr.word_timestamps = False
+
+    if args.audio:
+        audio = load_wav(args.audio, settings.sample_rate)
+    elif args.model:
+        sys.exit("--model needs --audio")
+    else:
+        audio = synthetic_audio(asr.duration, settings.sample_rate)
+
+    scheduler = AdaptiveScheduler(args.min_chunk, settings.max_chunk_sec, settings.latency_budget_sec,
+                                  settings.buffer_trimming_sec, settings.min_trimming_sec) if args.adaptive else None
+    detector = build_detector(settings) if args.detector else None
+    result = StreamingBenchmark(asr, audio, settings.sample_rate, min_chunk_sec=args.min_chunk,
+                                scheduler=scheduler, speculative=args.speculative, detector=detector).run()
+    if not args.per_iteration:
+        result.pop("per_iteration")
+    result = {"revision": git_revision(), "asr": type(asr).__name__, "min_chunk_sec": args.min_chunk,
+              "adaptive": args.adaptive, "hallucinate": args.hallucinate,
+              "word_timestamps": asr.word_timestamps, **result}
+
+    text = json.dumps(result, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as f:
+            f.write(text)
+    else:
+        print(text)
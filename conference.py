@@ -0,0 +1,107 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from app.ASRProcessor import ASRProcessor
+from app.BatchTranscriber import BatchTranscriber
+from app.HallucinationDetector import detector_from_settings
+from app.MultiStreamCapture import DeviceSource, FileSource, MultiStreamCapture
+from app.VoiceGate import VoiceGate
+from app.select_device import find_loopback_devices
+from settings import Settings
+
+
+def labelled(spec):
+    """'source=label' -> (source, label), the label is optional"""
+    source, _, label = spec.partition('=')
+    return source, label or None
+
+
+def open_sources(args, settings: Settings):
+    sources = []
+    for spec in args.file:
+        path, label = labelled(spec)
+        sources.append(FileSource(path, label, settings.sample_rate, settings.frames_per_buffer,
+                                  settings.capture_ring_sec, speed=args.speed))
+    devices = [labelled(spec) for spec in args.device]
+    if args.loopback:
+        devices += [(index, 'playback') for index in find_loopback_devices()][:1]
+    if devices:
+        import pyaudio
+        p = pyaudio.PyAudio()
+        for index, label in devices:
+            sources.append(DeviceSource(p, int(index), label, settings.sample_rate, settings.frames_per_buffer,
+                                        settings.capture_ring_sec))
+    return sources
+
+
+if __name__ == "__main__":
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Transcribe several inputs at once: microphone, playback, files")
+    parser.add_argument('-d', '--device', action='append', default=[], metavar='INDEX[=LABEL]',
+                        help="input device, repeat for several")
+    parser.add_argument('-l', '--loopback', action='store_true', help="add the first playback monitor device")
+    parser.add_argument('-f', '--file', action='append', default=[], metavar='WAV[=LABEL]',
+                        help="16-bit WAV played as a device, for testing without sound hardware")
+    parser.add_argument('--speed', type=float, default=1.0, help="file playback speed, 0 - as fast as decoded")
+    parser.add_argument('--mix', action='store_true', help="one transcript of all sources mixed together")
+    parser.add_argument('--script', help="ScriptedASR words JSON instead of the model (same script for every channel)")
+    args = parser.parse_args()
+
+    sources = open_sources(args, settings)
+    if not sources:
+        parser.error("no sources: give --device, --loopback or --file")
+    capture = MultiStreamCapture(sources, mix=args.mix, sampling_rate=settings.sample_rate,
+                                 wake_sec=settings.min_chunk_sec)
+
+    if args.script:
+        from app.models.ScriptedASR import ScriptedASR
+        asrs = {label: ScriptedASR.from_json(args.script, sampling_rate=settings.sample_rate)
+                for label in capture.labels}
+    else:
+        from app.models.FasterWhisper import FasterWhisperASR, model_config
+        # channels that iterate at the same time share one batched model call, a worker per channel decodes it
+        model = FasterWhisperASR(**model_config(settings, num_workers=max(settings.model_num_workers,
+                                                                          len(capture.labels))))
+        shared = BatchTranscriber(model, max_batch=len(capture.labels), sampling_rate=settings.sample_rate)
+        asrs = dict.fromkeys(capture.labels, shared)
+    processors = {label: ASRProcessor(asr, settings.sample_rate, prompt_max_tokens=settings.prompt_max_tokens,
+                                      buffer_trimming_sec=settings.buffer_trimming_sec)
+                  for label, asr in asrs.items()}
+    for processor in processors.values():
+        processor.hallucination_detector = detector_from_settings(settings)
+    if args.script:
+        for processor in processors.values():
+            processor.asr.processor = processor  # ScriptedASR follows the buffer position
+    gates = {label: VoiceGate(settings.sample_rate, threshold_db=settings.vad_threshold_db,
+                              margin_db=settings.vad_margin_db, keep_silence_sec=settings.vad_keep_silence_sec)
+             for label in capture.labels} if settings.vad_gate else {}
+
+    def step(label, audio):
+        processor = processors[label]
+        if label in gates:
+            audio = gates[label].feed(audio)
+        processor.insert_audio_chunk(audio)
+        if label not in gates or gates[label].take_speech():
+            return processor.process_iter()
+        return ""
+
+    capture.start()
+    print(f"Transcribing {', '.join(capture.labels)}, Ctrl+C to stop")
+    with ThreadPoolExecutor(len(processors)) as pool:
+        try:
+            while not capture.finished():
+                capture.wait_audio(settings.audio_wait_timeout_sec)
+                chunks = capture.read()
+                for label, text in zip(chunks, pool.map(step, chunks, chunks.values())):
+                    if text:
+                        print(f"[{label}] {text}", flush=True)
+        except KeyboardInterrupt:
+            pass
+    capture.stop()
+    for label, processor in processors.items():
+        # the gate may have held back the last chunk, transcribe the whole buffer once more before flushing
+        tail = (processor.process_iter() if len(processor.audio_buffer) else "") + processor.finish()
+        if tail:
+            print(f"[{label}] {tail}")
+    print(f"capture {capture.metrics()}")
+    capture.close()
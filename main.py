@@ -1,75 +1,223 @@
+import queue
 import threading
 import time
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
 
-import keyboard
 import pynput
-import pyperclip
 
 from app.ASRProcessor import ASRProcessor
+from app.AdaptiveScheduler import AdaptiveScheduler
 from app.AudioStreamManager import AudioStreamManager
+from app.HallucinationDetector import detector_from_settings
+from app.LatencyMeter import LatencyMeter
+from app.Metrics import IterationProfiler, MetricsWriter
+from app.ModelCache import ModelCache
+from app.OutputWorker import OutputWorker
 from app.RecordingIndicator import RecordingIndicator
-from app.models.FasterWhisper import FasterWhisperASR
+from app.RemoteProcessor import RemoteProcessor
+from app.RetranscribeQueue import RetranscribeQueue
+from app.SessionJournal import SessionJournal
+from app.SpeculativeOutput import SpeculativeOutput, join_edits
+from app.VoiceGate import VoiceGate
+from app.models.FasterWhisper import FasterWhisperASR, model_config
+from app.models.ProcessASR import ProcessASR
 from app.select_device import select_input_devices
+from app.startup import StartupTimer, load_in_background
 from settings import Settings
 
 from app.hotkeys import HotKeyListener
 
-def send_text(text):
-    # print(text or "", end="")
-    while keyboard.is_pressed('shift') or keyboard.is_pressed('ctrl') or keyboard.is_pressed('alt'):
-        time.sleep(0.1)
-    keyboard.write(text)
 
+def load_processor(settings: Settings, models: ModelCache):
+    if settings.server_address:
+        return RemoteProcessor(settings.server_address)
+    asr = models.get(**model_config(settings))
+    processor = ASRProcessor(asr, settings.sample_rate,
+                             prompt_max_tokens=settings.prompt_max_tokens,
+                             buffer_trimming_sec=settings.buffer_trimming_sec)
+    processor.hallucination_detector = detector_from_settings(settings)
+    return processor
+    # return ASRProcessorDemo(None, settings.sample_rate)
 
-def main(processor: ASRProcessor, indicator: RecordingIndicator, settings: Settings):
+
+def main(processor_future: Future, indicator: RecordingIndicator, settings: Settings, timer: StartupTimer,
+         models: ModelCache):
     record_is_process = threading.Event()
-    stream = AudioStreamManager(settings)
+    # set on stop until the session is finished, whatever the capture ring holds at that moment
+    recording_stopped = threading.Event()
+    with timer.phase('audio stream'):
+        stream = AudioStreamManager(settings)
+    scheduler = AdaptiveScheduler(settings.min_chunk_sec, settings.max_chunk_sec, settings.latency_budget_sec,
+                                  settings.buffer_trimming_sec, settings.min_trimming_sec)
+    # capture (PortAudio callback + ring) -> transcription (this thread) -> output (typing/clipboard worker)
+    output = OutputWorker(settings, maxsize=settings.output_queue_size)
+    gate = VoiceGate(settings.sample_rate,
+                     threshold_db=settings.vad_threshold_db,
+                     margin_db=settings.vad_margin_db,
+                     keep_silence_sec=settings.vad_keep_silence_sec) if settings.vad_gate else None
+    latency = LatencyMeter(settings.sample_rate, gate)
+
+    metrics_writer = profiler = speculative = None
+    # a RemoteProcessor neither journals nor trims: the audio and the buffer are on the server
+    remote = bool(settings.server_address)
+    journal = None
+    if settings.journal_dir and not remote:
+        journal = SessionJournal(settings.journal_dir, settings.sample_rate,
+                                 max_bytes=settings.journal_max_mb and settings.journal_max_mb * 2 ** 20,
+                                 max_age_sec=settings.journal_max_age_days and settings.journal_max_age_days * 86400)
+    adaptive = settings.adaptive_chunk and not remote
+
+    def offer_corrected(session, text):
+        if not text:
+            return
+        print(f"\nRe-transcribed {session}: {text}")
+        if settings.retranscribe_to_clipboard:
+            output.copy(text)
+
+    if journal is not None and settings.retranscribe_model_size:
+        jobs = RetranscribeQueue(Path(settings.journal_dir) / 'jobs.json', models,
+                                 model_config(settings, modelsize=settings.retranscribe_model_size,
+                                              beam_size=settings.retranscribe_beam_size),
+                                 workers=settings.retranscribe_workers,
+                                 is_idle=lambda: not record_is_process.is_set() and stream.empty(),
+                                 on_done=offer_corrected)
+        journal.on_closed = jobs.submit
 
-    def handle_recording():
+    # hotkeys and auto-stop only post commands, the control loop is the one place that starts and stops recording
+    commands = queue.SimpleQueue()
+    mouse = pynput.mouse.Controller()
+
+    def handle_recording(pressed_at):
         moment = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
         if not record_is_process.is_set():
-            stream.start_stream()
-            x, y = pynput.mouse.Controller().position
+            stream.start_recording(pressed_at)
+            x, y = mouse.position
             indicator.show(x, y)
+            if journal is not None:
+                journal.begin(model=settings.model_size, language=settings.model_language)
             record_is_process.set()
             print(f"\n{moment} Recording started.")
         else:
-            stream.stop_stream()
-            indicator.stop_recording()
+            # cleared before stop_recording() wakes the loop, so it sees the stop right away
             record_is_process.clear()
-            print(f"\n{moment} Recording stopped.")
+            recording_stopped.set()
+            stream.stop_recording()
+            indicator.stop_recording()
+            print(f"\n{moment} Recording stopped. capture {stream.metrics()}, output {output.metrics()}")
+            if speculative is not None:
+                print(f"speculative {speculative.metrics()}")
+            if metrics_writer is not None:
+                metrics_writer.write("recording_stopped", capture=stream.metrics(), output=output.metrics(),
+                                     speculative=speculative.metrics() if speculative is not None else None)
+
+    def control_loop():
+        while True:
+            command, pressed_at = commands.get()
+            if command == 'toggle' or command == 'stop' and record_is_process.is_set():
+                handle_recording(pressed_at)
 
-    HotKeyListener(handle_recording)
+    threading.Thread(target=control_loop, name='control', daemon=True).start()
+    HotKeyListener(lambda: commands.put(('toggle', time.time())))
+    timer.mark('hotkeys ready')
 
+    # the model loads in the background, audio recorded meanwhile waits in the capture ring
+    try:
+        processor: ASRProcessor = processor_future.result()
+    except Exception as e:
+        # no model, no server: nothing would ever read the capture ring, the tool exits instead of hanging
+        print(f"\nASR is not available, exiting: {e!r}")
+        record_is_process.clear()
+        stream.close()
+        indicator.hide()
+        indicator.quit()
+        return
+    timer.mark('model ready')
+    print(f"Startup: {timer.report()}")
+
+    metrics_writer = MetricsWriter(settings.metrics_file) if settings.metrics_file else None
+    for component in (stream, output, processor, getattr(processor, 'asr', None)):
+        if component is not None:
+            component.metrics_writer = metrics_writer
+    if metrics_writer is not None:
+        metrics_writer.write("startup", **timer.phases)
+    if journal is not None:
+        processor.journal = journal
+    if settings.speculative_output and hasattr(processor, 'speculative'):
+        speculative = SpeculativeOutput()
+    profiler = IterationProfiler(settings.profile_file) if settings.profile_file else None
+    if profiler is not None:
+        processor.process_iter = profiler.wrap(processor.process_iter)
+
+    stop_posted = False
     # try:
     while True:
         progressive_work = record_is_process.is_set() or not settings.stop_immediately
-        if stream.empty():
-            if record_is_process.is_set():
-                time.sleep(3)
-            else:
-                record_is_process.wait()
-        else:
-            all_text = ""
-            data_list = stream.get_audio_data()
+        if record_is_process.is_set():
+            # wakes on min_chunk_sec of new audio or on stop, so the next iteration starts right after the previous
+            stream.wait_audio(settings.audio_wait_timeout_sec)
+        elif stream.empty() and not recording_stopped.is_set():
+            record_is_process.wait()
+            continue
+        if stream.empty() and not recording_stopped.is_set():
+            continue
 
-            o = ""
-            if progressive_work:
-                processor.insert_audio_chunk(data_list)
+        all_text = ""
+        o = ""
+        spoken_at = None
+        has_audio = not stream.empty()
+        if has_audio:
+            capture_time = stream.last_chunk_time
+            data_list = stream.get_audio_data()
+        if progressive_work and has_audio:
+            latency.on_audio(len(data_list), capture_time)
+            if gate is not None:
+                data_list = gate.feed(data_list)
+            processor.insert_audio_chunk(data_list)
+            if gate is None or gate.take_speech():
+                t = time.time()
                 o = processor.process_iter()
+                if adaptive:
+                    scheduler.on_iteration(time.time() - t, processor)
+                    stream.set_wake_sec(scheduler.next_chunk_sec())
+            if o and getattr(processor, 'commited', None):
+                spoken_at = latency.spoken_at(processor.commited[-1].end)
+            if speculative is not None:
+                tail = processor.transcript_buffer.complete()
+                if tail:
+                    spoken_at = latency.spoken_at(tail[-1].end)
+                o = speculative.update(o, processor.speculative())
 
-            if stream.empty() and not record_is_process.is_set():
-                all_text = processor.gel_all_text().lstrip()
+        if (gate is not None and settings.vad_auto_stop_sec and record_is_process.is_set() and not stop_posted
+                and gate.silence_sec >= settings.vad_auto_stop_sec):
+            # posted once, the control loop stops the recording in its own time
+            commands.put(('stop', time.time()))
+            stop_posted = True
+
+        if recording_stopped.is_set() and stream.empty():
+            recording_stopped.clear()
+            all_text = processor.gel_all_text().lstrip()
+            if speculative is not None:
+                o = join_edits(o, speculative.update(processor.finish(), ""))
+            else:
                 o += processor.finish()
-                indicator.hide()
+            if journal is not None:
+                journal.end(processor.remove_stop_phrases(all_text))
+            latency.reset()
+            scheduler.reset()
+            if profiler is not None:
+                profiler.dump()
+            stream.set_wake_sec(settings.min_chunk_sec)
+            if gate is not None:
+                gate.reset()
+            indicator.hide()
+            stop_posted = False
 
-            if settings.typewrite and progressive_work:
-                o = processor.remove_stop_phrases(o)
-                send_text(o)
-                time.sleep(0.3)
-            if all_text and settings.copy_to_buffer:
-                all_text = processor.remove_stop_phrases(all_text)
-                pyperclip.copy(all_text)
+        if settings.typewrite and progressive_work:
+            output.type_text(o, spoken_at)
+        if all_text and settings.copy_to_buffer:
+            output.copy(processor.remove_stop_phrases(all_text))
 
     # except KeyboardInterrupt:
     #     pass
@@ -83,22 +231,26 @@ def main(processor: ASRProcessor, indicator: RecordingIndicator, settings: Setti
 
 if __name__ == "__main__":
     settings = Settings()
+    timer = StartupTimer()
+    factory = FasterWhisperASR
+    if settings.model_process:
+        factory = partial(ProcessASR, timeout_sec=settings.model_process_timeout_sec)
+    models = ModelCache(factory, settings.model_cache_size)
 
-    asr_cls = FasterWhisperASR
-    indicator = RecordingIndicator()
-    start_time = time.time()
+    def load():
+        with timer.phase('model load and warm-up'):
+            return load_processor(settings, models)
 
-    settings.active_microphone_device = select_input_devices() or 1
+    # the model does not need the microphone: it loads while the device is picked, even at a console prompt
+    processor_future = load_in_background(load)
 
-    processor = ASRProcessor(asr_cls(modelsize=settings.model_size,
-                                     lan=settings.model_language,
-                                     vad=settings.model_vad),
-                             settings.sample_rate)
-    # processor = ASRProcessorDemo(None, settings.sample_rate)
+    with timer.phase('indicator'):
+        indicator = RecordingIndicator()
+    with timer.phase('device selection'):
+        settings.active_microphone_device = select_input_devices(settings.device_cache_file) or 1
 
-    duration = time.time() - start_time
-    print(f'model loaded {duration:.2f} sec')
-    processing_thread = threading.Thread(target=main, args=(processor, indicator, settings))
+    processing_thread = threading.Thread(target=main, args=(processor_future, indicator, settings, timer, models),
+                                         name='transcription')
     processing_thread.start()
 
     indicator.root.mainloop()
@@ -0,0 +1,21 @@
+import argparse
+import asyncio
+
+from app.ASRServer import ASRServer
+from app.models.FasterWhisper import FasterWhisperASR, model_config
+from settings import Settings
+
+if __name__ == "__main__":
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Local streaming transcription server, one model for all clients")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=43007)
+    parser.add_argument('--max-batch', type=int, default=settings.server_max_batch)
+    args = parser.parse_args()
+
+    # a batch is decoded by num_workers CTranslate2 workers in parallel, fewer workers than the batch run it in turns
+    asr = FasterWhisperASR(**model_config(settings, num_workers=max(settings.model_num_workers, args.max_batch)))
+    try:
+        asyncio.run(ASRServer(asr, settings, max_batch=args.max_batch).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -6,15 +6,91 @@ class Settings:
     model_language = 'ru'
     model_vad = False
     model_size = 'large-v3'
+    model_device = 'auto'  # auto | cuda | cpu, auto и cuda без видеокарты откатываются на cpu int8
+    model_compute_type = 'auto'  # auto | float16 | int8_float16 | int8 | float32
+    model_cpu_threads = 0  # 0 - по умолчанию ctranslate2
+    model_num_workers = 1  # параллельных вызовов одной модели; каждый лишний стоит памяти, нужен только пакетам
+    model_beam_size = 5
+    model_word_timestamps = True  # False - без выравнивания слов, точные времена только у точки подтверждения
+    model_feature_cache = True  # не пересчитывать лог-мел признаки звука, оставшегося в буфере с прошлой итерации
+    # Модель в отдельном процессе: не отнимает GIL у захвата звука и интерфейса, падение CUDA не роняет программу,
+    # процесс перезапускается с перезагрузкой модели, уже распознанный текст и буфер звука не теряются
+    model_process = False
+    model_process_timeout_sec = 120  # итерация дольше - процесс модели считается зависшим и перезапускается
+    # адрес локального сервера распознавания (server.py) вида 'host:port', None - модель в этом процессе
+    server_address = None
+    # сессий в одном пакетном вызове модели; server.py поднимает model_num_workers до этого числа,
+    # иначе пакет распознаётся по одному и только ждёт сборки (conference.py - до числа источников)
+    server_max_batch = 4
+    prompt_max_tokens = 200  # подсказка модели из уже выведенного текста, whisper принимает не больше 223 токенов
+    # Детектор галлюцинаций: подозрительные куски гипотезы не подтверждаются, их звук распознаётся заново.
+    # Выключен по умолчанию: тихая или неразборчивая речь тоже бывает похожа на галлюцинацию
+    hallucination_detector = False
+    hallucination_min_probability = 0.25  # слово с вероятностью ниже - неуверенное
+    hallucination_low_probability_words = 3  # столько неуверенных слов подряд - галлюцинация
+    hallucination_max_ngram = 4  # самая длинная фраза, повтор которой ищется
+    hallucination_min_repeats = 3  # повторов фразы подряд после первого раза
+    hallucination_min_repeated_words = 6  # и слов в повторах не меньше, чтобы "да да да" не считалось зацикливанием
+    hallucination_max_compression_ratio = 2.4  # как у whisper: зацикленный текст хорошо сжимается
+    # параметры повторных попыток распознавания отвергнутого куска по очереди, после них ещё одна попытка
+    # с обычными параметрами, и если кусок всё равно подозрительный - он подтверждается как есть
+    hallucination_retries = ({'beam_size': 10}, {'temperature': 0.4, 'best_of': 5})
 
     active_microphone_device: int = 1
+    device_cache_file = 'local_settings.json'  # запоминает выбранный микрофон, None - спрашивать при каждом запуске
     sample_rate = 16000
+    frames_per_buffer = 4096  # размер буфера PortAudio на один вызов callback
+    capture_ring_sec = 60  # ёмкость кольцевого буфера захвата, при переполнении новые кадры отбрасываются
+    # поток микрофона открыт всё время, запись только переключает, куда идут кадры: старт без задержки устройства
+    keep_stream_open = True
+    preroll_sec = 0.3  # сколько звука до нажатия горячей клавиши добавлять в начало записи
 
     copy_to_buffer = True
     typewrite = True
+    # Сразу вводить неподтверждённую гипотезу и исправлять её стиранием, когда следующая итерация передумала:
+    # текст появляется на итерацию раньше, но часть символов перепечатывается
+    speculative_output = False
 
     stop_immediately = False
 
+    # Цикл обработки: просыпаемся, когда накопилось min_chunk_sec нового звука или запись остановлена
+    min_chunk_sec = 1.0
+    # Адаптивный размер порции: ждём примерно столько нового звука, сколько длилась прошлая итерация
+    adaptive_chunk = True
+    max_chunk_sec = 5.0
+    latency_budget_sec = 1.5  # итерация дольше этого - буфер звука обрезается раньше
+    buffer_trimming_sec = 30  # обрезка буфера звука по подтверждённым сегментам
+    min_trimming_sec = 8
+    audio_wait_timeout_sec = 1.0  # максимальное ожидание, после него обрабатываем то, что есть
+    modifier_poll_sec = 0.05  # опрос зажатых shift/ctrl/alt перед вводом
+    after_typing_pause_sec = 0.0
+    report_latency = True  # печатать задержку от произнесения до ввода
+    output_queue_size = 8  # очередь ввода текста, при переполнении фрагменты склеиваются, распознавание не ждёт
+
+    # Метрики каждой итерации, захвата и вывода в JSONL с ротацией по размеру, None - не писать
+    metrics_file = None  # 'metrics.jsonl' - включить
+    profile_file = None  # 'process_iter.prof' - cProfile вокруг process_iter, сохраняется при остановке записи
+
+    # Журнал сессий: звук и подтверждённые слова с временными метками пишутся на диск, None - не писать
+    journal_dir = None  # 'journal' - включить
+    # старые сессии удаляются, когда журнал больше journal_max_mb или сессия старше journal_max_age_days, None - без предела
+    journal_max_mb = 2048
+    journal_max_age_days = 30
+    # Повторное распознавание сохранённых сессий более точной моделью в фоне, пока не идёт запись.
+    # Задания хранятся в <journal_dir>/jobs.json и переживают перезапуск, результат - final.txt в папке сессии
+    retranscribe_model_size = None  # например 'large-v3' при диктовке на 'small', None - не распознавать повторно
+    retranscribe_beam_size = 5
+    retranscribe_workers = 1
+    retranscribe_to_clipboard = True  # исправленный текст копируется в буфер обмена
+    model_cache_size = 2  # сколько разных моделей держать загруженными, лишние выгружаются (LRU)
+
+    # Энергетический VAD перед моделью: пропускаем итерации без новой речи и выкидываем длинные паузы
+    vad_gate = True
+    vad_threshold_db = -50.0  # абсолютный порог громкости речи
+    vad_margin_db = 12.0  # насколько речь должна быть громче адаптивного уровня шума
+    vad_keep_silence_sec = 0.5  # сколько тишины оставлять до и после речи
+    vad_auto_stop_sec = 0.0  # остановить запись после стольких секунд тишины, 0 - не останавливать
+
     # Варианты использования:
     # - наговорить и вставить без ввода по дорогое
     # - дождаться окончания и завершить
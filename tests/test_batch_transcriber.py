@@ -0,0 +1,135 @@
+"""CPU-only checks of the batching front of the ASR: no model, a stub records the batches it gets"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.BatchTranscriber import BatchTranscriber, transcribe_batch
+from app.models.FasterWhisper import FasterWhisperASR
+from app.models.types import Word
+
+
+class StubASR:
+    """Returns one word holding the id written into the audio, fails batches that hold the id `fail`"""
+    sep = ""
+    STOP_PHRASES = set()
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.batches = []
+
+    def count_tokens(self, text):
+        return len(text)
+
+    def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+        return self.transcribe_batch([audio], [init_prompt], [align_from], [options])[0]
+
+    def transcribe_batch(self, audios, prompts, align_from=None, options=None):
+        ids = [int(audio[0]) for audio in audios]
+        self.batches.append(ids)
+        if self.fail in ids:
+            raise RuntimeError(f"batch {ids} failed")
+        return [([Word(0.0, 1.0, f"{i}:{prompt}", 1.0)], [1.0]) for i, prompt in zip(ids, prompts)]
+
+
+def audio_of(i):
+    return np.full(1600, i, dtype=np.float32)
+
+
+def run_concurrently(batcher, ids):
+    """Calls batcher.transcribe from one thread per id at once, returns {id: result or exception}"""
+    results = {}
+    start = threading.Barrier(len(ids))
+
+    def call(i):
+        start.wait()
+        try:
+            results[i] = batcher.transcribe(audio_of(i), init_prompt=f"p{i}")
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+def test_concurrent_calls_are_grouped_into_one_batch():
+    asr = StubASR()
+    batcher = BatchTranscriber(asr, max_batch=4, max_wait_sec=0.5)
+    run_concurrently(batcher, [1, 2, 3, 4])
+    assert asr.batches and sorted(asr.batches[0]) == [1, 2, 3, 4]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["mean_batch"] == 4
+
+
+def test_batches_never_exceed_max_batch():
+    asr = StubASR()
+    batcher = BatchTranscriber(asr, max_batch=4, max_wait_sec=0.2)
+    run_concurrently(batcher, list(range(1, 11)))
+    assert all(len(batch) <= 4 for batch in asr.batches)
+    assert sorted(i for batch in asr.batches for i in batch) == list(range(1, 11))
+
+
+def test_a_lone_call_waits_at_most_max_wait():
+    asr = StubASR()
+    batcher = BatchTranscriber(asr, max_batch=4, max_wait_sec=0.1)
+    t = time.time()
+    words, _ = batcher.transcribe(audio_of(7))
+    assert time.time() - t < 0.5
+    assert asr.batches == [[7]] and words[0].word == "7:"
+
+
+def test_every_caller_gets_its_own_result():
+    batcher = BatchTranscriber(StubASR(), max_batch=8, max_wait_sec=0.2)
+    results = run_concurrently(batcher, [5, 3, 8, 1, 6])
+    for i, (words, ends) in results.items():
+        assert words[0].word == f"{i}:p{i}" and ends == [1.0]
+
+
+def test_a_failed_batch_raises_in_every_waiting_session():
+    asr = StubASR(fail=2)
+    batcher = BatchTranscriber(asr, max_batch=4, max_wait_sec=0.5)
+    results = run_concurrently(batcher, [1, 2, 3])
+    assert len(asr.batches) == 1
+    assert all(isinstance(r, RuntimeError) for r in results.values())
+    # the worker thread survives and serves the next call
+    words, _ = batcher.transcribe(audio_of(4))
+    assert words[0].word == "4:"
+
+
+def test_transcribe_batch_falls_back_to_one_by_one():
+    calls = []
+
+    class Sequential:
+        def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+            calls.append((int(audio[0]), init_prompt, align_from, options))
+            return [], []
+
+    transcribe_batch(Sequential(), [audio_of(1), audio_of(2)], ["a", "b"], [0.5, None], [None, {"beam_size": 1}])
+    assert calls == [(1, "a", 0.5, None), (2, "b", None, {"beam_size": 1})]
+
+
+def test_faster_whisper_batch_keeps_the_order_of_its_inputs():
+    # the batched path of FasterWhisperASR without a model: the pool maps transcribe over the inputs
+    asr = FasterWhisperASR.__new__(FasterWhisperASR)
+    asr.batch_pool = ThreadPoolExecutor(3)
+
+    def transcribe(audio, init_prompt="", align_from=None, options=None):
+        time.sleep(0.05 / int(audio[0]))  # the first input finishes last
+        return [Word(0.0, 1.0, f"{int(audio[0])}:{init_prompt}:{align_from}:{options}", 1.0)], [1.0]
+
+    asr.transcribe = transcribe
+    results = asr.transcribe_batch([audio_of(1), audio_of(2), audio_of(3)], ["a", "b", "c"],
+                                   [None, 1.5, None], [None, None, {"temperature": 0.4}])
+    assert [words[0].word for words, _ in results] == \
+        ["1:a:None:None", "2:b:1.5:None", "3:c:None:{'temperature': 0.4}"]
+    results = asr.transcribe_batch([audio_of(4), audio_of(5)])
+    assert [words[0].word for words, _ in results] == ["4::None:None", "5::None:None"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
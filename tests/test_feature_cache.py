@@ -0,0 +1,58 @@
+"""CachedFeatureExtractor against itself without a cache: reused frames must be the frames it would compute"""
+import numpy as np
+
+from app.models.FeatureCache import CachedFeatureExtractor
+
+RATE, HOP = 16000, 160
+
+
+class Extractor:
+    """The attributes of faster-whisper's FeatureExtractor the cache reads"""
+    n_fft = 400
+    hop_length = HOP
+    sampling_rate = RATE
+    n_samples = 30 * RATE
+    nb_max_frames = 3000
+    mel_filters = np.random.default_rng(0).random((80, 201)).astype(np.float32)
+
+
+def noise(sec, seed):
+    return (np.random.default_rng(seed).standard_normal(int(sec * RATE)) * 0.1).astype(np.float32)
+
+
+def uncached(audio):
+    return CachedFeatureExtractor(Extractor())(audio)
+
+
+def test_streaming_buffers_reuse_frames_and_match_a_full_computation():
+    cache = CachedFeatureExtractor(Extractor())
+    # pre-roll silence, then speech arriving a second at a time, trimmed on the hop grid
+    buffer = np.zeros(3 * RATE, np.float32)
+    for step in range(6):
+        buffer = np.concatenate([buffer, noise(1, step)])
+        if step == 3:
+            buffer = buffer[120 * HOP:]
+        assert np.array_equal(cache(buffer), uncached(buffer))
+    assert cache.stats()["hit_rate"] > 0.5
+
+
+def test_long_silence_does_not_make_every_position_a_candidate(monkeypatch):
+    cache = CachedFeatureExtractor(Extractor())
+    silence = np.zeros(20 * RATE, np.float32)
+    for seed in range(4):
+        cache(np.concatenate([silence, noise(5, seed)]))
+    compared = []
+    real_equal = np.array_equal
+    monkeypatch.setattr(np, 'array_equal', lambda a, b: compared.append(len(a)) or real_equal(a, b))
+    # another stream that also begins with silence: no cached buffer continues into it
+    other = np.concatenate([silence, noise(6, 99)])
+    assert cache._align(other) is None
+    assert len(compared) <= len(cache._entries) * cache.max_candidates
+
+
+def test_a_silent_tail_falls_back_to_a_full_computation():
+    cache = CachedFeatureExtractor(Extractor())
+    buffer = np.concatenate([noise(3, 1), np.zeros(4 * RATE, np.float32)])
+    cache(buffer)
+    nxt = np.concatenate([buffer[300 * HOP:], np.zeros(RATE, np.float32)])
+    assert np.array_equal(cache(nxt), uncached(nxt))
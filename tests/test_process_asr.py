@@ -0,0 +1,63 @@
+"""ProcessASR with a stub model in the worker: restarts after the worker dies, and a clean exit afterwards"""
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from app.models.ProcessASR import ProcessASR
+from app.models.types import Word
+
+ROOT = Path(__file__).resolve().parent.parent
+TARGET = 'tests.test_process_asr:StubASR'
+
+
+class StubASR:
+    """Loaded in the worker by ProcessASR(target=...): one word per call, its text is the audio length"""
+    sep = ""
+    STOP_PHRASES = set()
+    word_timestamps = True
+
+    def __init__(self, **config):
+        pass
+
+    def count_tokens(self, text):
+        return len(text)
+
+    def transcribe(self, audio, init_prompt="", align_from=None, options=None):
+        return [Word(0.0, len(audio) / 16000, f" {len(audio)}", 0.9)], [len(audio) / 16000]
+
+
+def test_worker_killed_between_requests_is_restarted():
+    asr = ProcessASR(timeout_sec=10, target=TARGET)
+    try:
+        assert asr.transcribe(np.zeros(1600, np.float32))[0][0].word == " 1600"
+        asr._process.kill()
+        asr._process.join(5)
+        words, _ = asr.transcribe(np.zeros(3200, np.float32))
+        assert words[0].word == " 3200" and asr.restarts == 1 and asr.alive
+    finally:
+        asr.close()
+
+
+# without close(): the finalizers run at interpreter exit, each must clean up only what is still there
+EXIT_SCRIPT = f"""
+import numpy as np
+from app.models.ProcessASR import ProcessASR
+
+if __name__ == "__main__":
+    asr = ProcessASR(timeout_sec=10, target={TARGET!r})
+    asr.transcribe(np.zeros(1600, np.float32))
+    asr._process.kill()
+    asr._process.join(5)
+    words, _ = asr.transcribe(np.zeros(1600, np.float32))
+    print(words[0].word.strip(), asr.restarts)
+"""
+
+
+def test_process_exits_cleanly_after_a_restart():
+    result = subprocess.run([sys.executable, '-c', EXIT_SCRIPT], cwd=ROOT, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == "1600 1"
+    assert "Traceback" not in result.stderr and "Exception ignored" not in result.stderr, result.stderr
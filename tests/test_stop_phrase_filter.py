@@ -0,0 +1,60 @@
+"""Streaming stop-phrase removal: the text typed piece by piece must match the one-shot result"""
+import random
+
+from app.StopPhraseFilter import StopPhraseFilter, StopPhraseMatcher
+from app.models.FasterWhisper import load_stop_phrases
+
+MATCHER = StopPhraseMatcher(load_stop_phrases('ru'))
+# words that begin like the stop phrases (С, П, Д, И, Р, К) or are their first words, none makes a phrase
+WORDS = ["у", "нас", "всё", "хорошо.", "Спасибо", "за", "сделал", "Субтитры", "Редактор", "Продолжаем", "до",
+         "новых", "и,", "конечно", "с", "к", "Добро", "Корректор", "смотрите"]
+PHRASES = ["Продолжение следует...", "Спасибо за внимание.", "Субтитры сделал DimaTorzok", "До новых встреч."]
+
+
+def stream(pieces):
+    f = StopPhraseFilter(MATCHER)
+    outputs = [f.feed(piece) for piece in pieces]
+    return outputs, f.flush()
+
+
+def test_a_word_is_never_split_between_feeds():
+    rng = random.Random(1)
+    for _ in range(200):
+        commits = [" " + rng.choice(WORDS) for _ in range(rng.randint(1, 12))]
+        text = "".join(commits)
+        outputs, rest = stream(commits)
+        typed = ""
+        for out in outputs:
+            typed += out
+            assert text.startswith(typed)
+            # what is typed so far ends at a word end: the next character, if any, is not a letter
+            assert len(typed) == len(text) or not text[len(typed)].isalnum(), (commits, typed)
+        assert typed + rest == text
+
+
+def test_a_word_ending_in_a_phrase_letter_is_typed_at_once():
+    f = StopPhraseFilter(MATCHER)
+    assert f.feed(" у нас") == " у нас"
+    assert f.feed(" всё хорошо.") == " всё хорошо."
+
+
+def test_streaming_matches_one_shot_at_any_split():
+    rng = random.Random(2)
+    for _ in range(300):
+        parts = [rng.choice(WORDS + PHRASES) for _ in range(rng.randint(1, 8))]
+        text = " " + " ".join(parts)
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 6))))
+        pieces = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        outputs, rest = stream(pieces)
+        assert "".join(outputs) + rest == StopPhraseFilter(MATCHER).remove(text), pieces
+
+
+def test_a_phrase_split_between_feeds_is_removed():
+    outputs, rest = stream([" Итак. Спа", "сибо за вни", "мание. Дальше"])
+    assert "".join(outputs) + rest == " Итак. Дальше"
+
+
+def test_a_phrase_inside_a_word_is_kept():
+    remove = StopPhraseFilter(MATCHER).remove
+    assert remove(" Переспасибо за внимание.") == " Переспасибо за внимание."
+    assert remove(" Раз. Продолжение следует... Два") == " Раз. Два"
@@ -0,0 +1,40 @@
+import argparse
+import time
+from pathlib import Path
+
+from app.FileTranscriber import FileTranscriber, WRITERS, collect_files, load_audio
+from app.models.FasterWhisper import FasterWhisperASR, model_config
+from settings import Settings
+
+if __name__ == "__main__":
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Transcribe audio files or directories as fast as possible")
+    parser.add_argument('paths', nargs='+', help="audio files or directories")
+    parser.add_argument('-f', '--format', choices=WRITERS, default='txt')
+    parser.add_argument('-o', '--out-dir', help="where to write results, next to the audio by default")
+    parser.add_argument('-w', '--workers', type=int, default=2, help="parallel chunk decoders")
+    parser.add_argument('--language', default=settings.model_language)
+    parser.add_argument('--model-size', default=settings.model_size)
+    parser.add_argument('--device', default=settings.model_device)
+    parser.add_argument('--compute-type', default=settings.model_compute_type)
+    args = parser.parse_args()
+
+    # chunks are cut from the file and never overlap a previous buffer, so there is nothing for the feature cache,
+    # and they are stitched by word times, so every word is aligned whatever the streaming setting is
+    asr = FasterWhisperASR(**model_config(settings, lan=args.language, modelsize=args.model_size, device=args.device,
+                                          compute_type=args.compute_type, num_workers=args.workers,
+                                          feature_cache=False, word_timestamps=True))
+    transcriber = FileTranscriber(asr, workers=args.workers, sampling_rate=settings.sample_rate)
+    writer = WRITERS[args.format]
+
+    for path in collect_files(args.paths):
+        t = time.time()
+        audio = load_audio(path, settings.sample_rate)
+        words = transcriber.transcribe(audio)
+        out_dir = Path(args.out_dir) if args.out_dir else path.parent
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out = out_dir / f"{path.stem}.{args.format}"
+        out.write_text(writer(words, asr.sep), encoding='utf8')
+        duration = len(audio) / settings.sample_rate
+        elapsed = time.time() - t
+        print(f"{path} -> {out}: {duration:.1f} s of audio in {elapsed:.1f} s ({duration / elapsed:.1f}x)")